@@ -0,0 +1,321 @@
+"""
+python bench.py [benchmark ...]
+
+Benchmarks that don't need a real desktop, they run on the simulated backend
+    (or in a fresh interpreter) so they work anywhere. Anything over its budget
+    makes us exit non zero, so this can gate a commit
+"""
+
+import sys
+import random
+import subprocess
+from time import perf_counter
+from statistics import median
+from typing import Callable
+
+BENCHMARKS: dict[str, Callable[[], tuple[bool, str]]] = dict()
+
+# fmt: off
+IMPORT_RUNS      = 15
+IMPORT_BUDGET_MS = 25
+# Nothing in here should get loaded just from importing lib.WindowHandler
+IMPORT_FORBIDDEN = ["win32api", "win32gui", "win32process", "win32con", "pywintypes", "dataclasses", "typing", "lib.WindowHandler.managers"]
+# Looking something up brings in managers, still none of the rest
+LOOKUP_BUDGET_MS = 30
+LOOKUP_FORBIDDEN = [m for m in IMPORT_FORBIDDEN if m != "lib.WindowHandler.managers"]
+
+GEOMETRY_WINDOWS   = 5000
+GEOMETRY_POINTS    = 10000
+GEOMETRY_BUDGET_MS = 150
+
+CONTROL_FANOUT    = 3
+CONTROL_DEPTH     = 8
+CONTROL_CHAIN     = 2000
+CONTROL_BUDGET_MS = 25
+
+# Milliseconds EnumDesktopWindows takes on each made up desktop
+DESKTOP_LATENCIES_MS = [10, 20, 30, 40, 50, 60]
+# How far over the slowest desktop a sweep is allowed to get
+DESKTOP_SLACK_MS     = 25
+
+TIMELINE_ROWS      = 1_000_000
+TIMELINE_APPS      = 40
+TIMELINE_BUDGET_MS = 100
+# fmt: on
+
+
+def benchmark(function: Callable[[], tuple[bool, str]]):
+    BENCHMARKS[function.__name__.removeprefix("bench_")] = function
+    return function
+
+
+@benchmark
+def bench_import():
+    # A fresh interpreter every run, anything cached would be cheating
+    code = "\n".join(
+        [
+            "import sys, time",
+            "start = time.perf_counter()",
+            "import lib.WindowHandler",
+            "took = (time.perf_counter() - start) * 1000",
+            f"loaded = [m for m in {IMPORT_FORBIDDEN!r} if m in sys.modules]",
+            # Every lookup goes through managers, that has to stay cheap too
+            "start = time.perf_counter()",
+            "lib.WindowHandler.searchForWindowByTitle",
+            "lookup = (time.perf_counter() - start) * 1000",
+            f"loaded += [m for m in {LOOKUP_FORBIDDEN!r} if m in sys.modules]",
+            "print(took, took + lookup, ','.join(loaded))",
+        ]
+    )
+
+    timings, lookups, loaded = [], [], set()
+    for _ in range(IMPORT_RUNS):
+        out = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout.split(" ")
+
+        timings.append(float(out[0]))
+        lookups.append(float(out[1]))
+        loaded.update(module for module in out[2].strip().split(",") if module)
+
+    took, lookup = median(timings), median(lookups)
+    message = (
+        f"import lib.WindowHandler: {took:.2f}ms median of {IMPORT_RUNS} (budget {IMPORT_BUDGET_MS}ms)"
+        f", with the first lookup {lookup:.2f}ms (budget {LOOKUP_BUDGET_MS}ms)"
+    )
+    if loaded:
+        message += f", eagerly loaded {sorted(loaded)}"
+
+    ok = took <= IMPORT_BUDGET_MS and lookup <= LOOKUP_BUDGET_MS and not loaded
+    return (ok, message)
+
+
+@benchmark
+def bench_geometry():
+    try:
+        import numpy
+    except ImportError:
+        return (True, "skipped, numpy isn't installed")
+
+    from lib.WindowHandler.geometry import GeometryTable
+
+    rng = random.Random(12)
+    rects = []
+    for _ in range(GEOMETRY_WINDOWS):
+        left, top = rng.randrange(0, 3840), rng.randrange(0, 2160)
+        rects.append(
+            (left, top, left + rng.randrange(50, 1200), top + rng.randrange(50, 900))
+        )
+
+    hwnds = list(range(0x10000, 0x10000 + 2 * GEOMETRY_WINDOWS, 2))
+    points = [
+        (rng.randrange(0, 3840), rng.randrange(0, 2160)) for _ in range(GEOMETRY_POINTS)
+    ]
+
+    start = perf_counter()
+    table = GeometryTable(hwnds, rects)
+    buildMs = (perf_counter() - start) * 1000
+
+    start = perf_counter()
+    found = table.windowsAt(points)
+    hitMs = (perf_counter() - start) * 1000
+
+    start = perf_counter()
+    for index in range(len(table)):
+        table.isOccluded(int(table.hwnds[index]))
+    occludedMs = (perf_counter() - start) * 1000
+
+    # Spot check against the obvious python loop
+    for point, hwnd in list(zip(points, found))[:200]:
+        x, y = point
+        expected = next(
+            (h for h, (l, t, r, b) in zip(hwnds, rects) if l <= x < r and t <= y < b), 0
+        )
+        if expected != hwnd:
+            return (False, f"windowsAt{point} gave {hwnd}, expected {expected}")
+
+    message = (
+        f"{GEOMETRY_WINDOWS} windows: build {buildMs:.2f}ms, {GEOMETRY_POINTS} points"
+        f" {hitMs:.2f}ms (budget {GEOMETRY_BUDGET_MS}ms), isOccluded x{len(table)} {occludedMs:.2f}ms"
+    )
+    return (hitMs <= GEOMETRY_BUDGET_MS, message)
+
+
+@benchmark
+def bench_controls():
+    from lib.WindowHandler import useBackend
+    from lib.WindowHandler.backends import SimulatedBackend
+    from lib.WindowHandler.controls import controlTree
+
+    desktop = SimulatedBackend()
+    dialog = desktop.createWindow("Deep Dialog")
+
+    # A full CONTROL_FANOUT-ary tree, the last leaf is the one we go looking for
+    level, controlID = [dialog], 0
+    for depth in range(CONTROL_DEPTH):
+        nextLevel = []
+        for parent in level:
+            for _ in range(CONTROL_FANOUT):
+                controlID += 1
+                className = "Edit" if depth == CONTROL_DEPTH - 1 else "Button"
+                nextLevel.append(
+                    desktop.createControl(
+                        parent, className, f"Control {controlID}", controlID
+                    )
+                )
+        level = nextLevel
+    target = level[-1]
+
+    # And one absurdly deep chain, nothing in there gets to recurse
+    chain = dialog
+    for _ in range(CONTROL_CHAIN):
+        chain = desktop.createControl(chain, "Static", "", 0)
+
+    previous = useBackend(desktop)
+    try:
+        start = perf_counter()
+        tree = controlTree(dialog)
+        buildMs = (perf_counter() - start) * 1000
+
+        start = perf_counter()
+        cold = tree.find(controlID=controlID)
+        coldMs = (perf_counter() - start) * 1000
+
+        # First class search fetches every class name, the second one is all cache
+        search = dict(className="Edit", title=f"Control {controlID}", exact=True)
+        start = perf_counter()
+        first = controlTree(dialog).find(**search)
+        firstMs = (perf_counter() - start) * 1000
+
+        start = perf_counter()
+        warm = controlTree(dialog).find(**search)
+        warmMs = (perf_counter() - start) * 1000
+
+        start = perf_counter()
+        recheck = controlTree(dialog, maxAge=0)
+        recheckMs = (perf_counter() - start) * 1000
+    finally:
+        useBackend(previous)
+
+    for found in (cold, first, warm):
+        if found == None or found.hwnd != target:
+            return (False, f"found {found}, expected hwnd {target}")
+
+    if recheck is not tree:
+        return (False, "an unchanged tree got rebuilt")
+
+    message = (
+        f"{len(tree)} controls: build {buildMs:.2f}ms, find by id {coldMs:.2f}ms,"
+        f" by class+title {firstMs:.2f}ms then {warmMs:.2f}ms cached (budget {CONTROL_BUDGET_MS}ms),"
+        f" change check {recheckMs:.2f}ms"
+    )
+    return (warmMs <= CONTROL_BUDGET_MS, message)
+
+
+@benchmark
+def bench_desktops():
+    from lib.WindowHandler import useBackend
+    from lib.WindowHandler.backends import SimulatedBackend
+    from lib.WindowHandler.desktops import DesktopSnapshot
+
+    desktop = SimulatedBackend()
+    names = []
+    for index, latency in enumerate(DESKTOP_LATENCIES_MS):
+        name = f"Desktop {index}"
+        desktop.createDesktop(name, latency=latency / 1000)
+        for i in range(200):
+            desktop.createWindow(f"{name} Window {i}", desktop=name)
+        names.append(name)
+
+    previous = useBackend(desktop)
+    try:
+        # The first one starts the worker threads, that's not what we're measuring
+        DesktopSnapshot.take(names)
+        snapshot = DesktopSnapshot.take(names)
+    finally:
+        useBackend(previous)
+
+    if len(snapshot) != 200 * len(names):
+        return (False, f"found {len(snapshot)} windows, expected {200 * len(names)}")
+
+    tookMs = snapshot.elapsed * 1000
+    budgetMs = max(DESKTOP_LATENCIES_MS) + DESKTOP_SLACK_MS
+    message = (
+        f"{len(names)} desktops, {len(snapshot)} windows: sweep {tookMs:.2f}ms"
+        f" (budget {budgetMs}ms, serially {sum(DESKTOP_LATENCIES_MS)}ms+)"
+    )
+    return (tookMs <= budgetMs, message)
+
+
+@benchmark
+def bench_timeline():
+    try:
+        import numpy as np
+    except ImportError:
+        return (True, "skipped, numpy isn't installed")
+
+    import os
+    import tempfile
+    from lib.WindowHandler.timeline import TimelineSegment
+
+    # A year of somebody alt-tabbing every half minute, give or take
+    rng = np.random.default_rng(12)
+    at = np.cumsum(rng.uniform(1, 60, TIMELINE_ROWS))
+    exe = rng.integers(0, TIMELINE_APPS, TIMELINE_ROWS, dtype=np.int32)
+    columns = {
+        "at": at,
+        "hwnd": (exe.astype(np.int64) * 2 + 0x10000),
+        "processID": (exe.astype(np.uint32) * 4 + 1000),
+        "exe": exe,
+    }
+    exePaths = [f"C:\\Apps\\{index}.exe" for index in range(TIMELINE_APPS)]
+    segment = TimelineSegment(columns, exePaths, float(at[-1]) + 30)
+
+    start = perf_counter()
+    perApp = segment.timeInApp(float(at[1000]), float(at[-1000]))
+    queryMs = (perf_counter() - start) * 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.fgt")
+
+        start = perf_counter()
+        segment.save(path)
+        saveMs = (perf_counter() - start) * 1000
+
+        start = perf_counter()
+        loaded = TimelineSegment.load(path)
+        loadMs = (perf_counter() - start) * 1000
+
+        start = perf_counter()
+        loadedPerApp = loaded.timeInApp(float(at[1000]), float(at[-1000]))
+        mappedMs = (perf_counter() - start) * 1000
+        del loaded
+
+    if len(perApp) != TIMELINE_APPS or perApp != loadedPerApp:
+        return (False, "the loaded segment doesn't agree with the one that was saved")
+
+    message = (
+        f"{TIMELINE_ROWS} transitions: timeInApp {queryMs:.2f}ms (budget {TIMELINE_BUDGET_MS}ms),"
+        f" save {saveMs:.2f}ms, load {loadMs:.2f}ms, timeInApp mapped {mappedMs:.2f}ms"
+    )
+    return (queryMs <= TIMELINE_BUDGET_MS, message)
+
+
+def main(names: list[str]) -> int:
+    names = names or list(BENCHMARKS)
+    failed = 0
+
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}', have {list(BENCHMARKS)}")
+            return 2
+
+        ok, message = BENCHMARKS[name]()
+        failed += not ok
+        print(f"[{'ok' if ok else 'OVER'}] {name:<12} {message}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -10,7 +10,12 @@ class BaseActionableWindow:
         raise NotImplementedError("No Implementation")
 
     def close(self):
-        raise NotImplementedError("No Implementation")
+        haveWindow = self.isOpen()
+        if not haveWindow:
+            return False
+
+        # sendWindowMessage returns isError
+        return not haveWindow.tryDestroy()
 
     def isOpen(self):
         haveWindow = searchForWindowByTitle(self.windowKeyWord, self.keywordFilter)
@@ -18,3 +23,11 @@ class BaseActionableWindow:
             return haveWindow
 
         return False
+
+    def waitForOpenStep(self, name: str, **kwargs):
+        "A WaitForWindow workflow step for this window, kwargs are passed to the step"
+        from lib.Workflow import WaitForWindow
+
+        return WaitForWindow(
+            name, keyword=self.windowKeyWord, ignore=self.keywordFilter, **kwargs
+        )
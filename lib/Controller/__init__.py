@@ -0,0 +1,413 @@
+import os
+import sys
+import secrets
+from getpass import getuser
+from time import perf_counter
+from queue import Queue, Empty, Full
+from threading import Thread, Event, Lock
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client, Connection
+
+from lib.WindowHandler import Window, Rect, win32, getWindowAsObject
+from lib.WindowHandler.managers import WindowSnapshot
+from lib.WindowHandler.desktops import DesktopSnapshot
+from lib.WindowHandler.errors import getErrorChannel
+from lib.WindowHandler.handles import handlePool
+
+# fmt: off
+# Per user, pipe names are machine wide and /tmp is everybody's
+if sys.platform == "win32":
+    CONTROLLER_ADDRESS = rf"\\.\pipe\AutomationController-{getuser()}"
+else:
+    CONTROLLER_ADDRESS = os.path.join(os.environ.get("XDG_RUNTIME_DIR", "/tmp"), f"automation-controller-{os.getuid()}.sock")
+
+CONTROLLER_AUTHKEY_FILE = os.path.join(os.path.expanduser("~"), ".automation-controller.key")
+CONTROLLER_AUTHKEY_BYTES = 32
+
+CONTROLLER_REFRESH_TIME    = 0.25
+CONTROLLER_SUBSCRIBE_QUEUE = 256
+
+EVENT_FOREGROUND = "foreground"
+EVENT_CREATED    = "created"
+EVENT_DESTROYED  = "destroyed"
+# fmt: on
+
+
+class ControllerError(Exception):
+    def __init__(self, message: str, *args: object) -> None:
+        super().__init__(message, *args)
+
+
+def __deadWindow__(hwnd: int, windowText: str) -> Window:
+    # It's gone, Window() would go ask the OS about it and there's nothing left to ask
+    window = Window.__new__(Window)
+    window.hwnd, window.threadID, window.processID = hwnd, 0, 0
+    window.windowTitle = windowText
+    window.exePath = ""
+    window.windowRect = Rect(None, None, None, None)
+    return window
+
+
+def getAuthkey(path: str = CONTROLLER_AUTHKEY_FILE) -> bytes:
+    """
+    The per user key both ends authenticate with, made the first time it's needed
+
+    Whoever can read it can drive our desktop, so it's only readable by us. It's
+        also what stops somebody squatting on the address from feeding a client
+        pickles, the client checks the server knows the key before reading anything
+    """
+
+    try:
+        with open(path, "rb") as file:
+            key = file.read()
+    except FileNotFoundError:
+        key = b""
+
+    if key:
+        return key
+
+    key = secrets.token_bytes(CONTROLLER_AUTHKEY_BYTES)
+    try:
+        descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Somebody else got there first, theirs wins
+        with open(path, "rb") as file:
+            return file.read()
+
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(key)
+
+    return key
+
+
+class ControllerServer:
+    """
+    Keeps one warm WindowSnapshot, a Window cache and a single watcher thread
+        for everybody, clients talk to it over a named pipe (or a unix socket)
+
+    ex: server = ControllerServer()
+        server.serveForever()
+
+    Requests are (op, kwargs) tuples, replies are ("ok", value) or ("error", message),
+        see lib.Controller.client for the other side
+
+    desktops: watch these desktops (all in parallel) instead of just our own
+    authkey: None uses the per user key from getAuthkey()
+    """
+
+    def __init__(
+        self,
+        address: str = CONTROLLER_ADDRESS,
+        authkey: bytes = None,
+        refreshSeconds: float = CONTROLLER_REFRESH_TIME,
+        desktops: list[str] = None,
+    ) -> None:
+        self.address = address
+        self.authkey = authkey if authkey != None else getAuthkey()
+        self.refreshSeconds = refreshSeconds
+        self.desktops = desktops
+
+        self.snapshot: WindowSnapshot = None
+        self.foreground: int = 0
+        self.snapshotLock = Lock()
+        # Only one take and swap at a time, so the snapshot never goes backwards
+        self.refreshLock = Lock()
+
+        # hwnd -> Window, building one costs an OpenProcess so we only do it once per title
+        self.windowCache: dict[int, Window] = dict()
+
+        self.subscribers: list[tuple[str, str, Queue]] = list()
+        self.subscribersLock = Lock()
+
+        self.stopFlag = Event()
+        self.listener: Listener = None
+        self.stats = {
+            "requests": 0,
+            "refreshes": 0,
+            "cacheHits": 0,
+            "cacheMisses": 0,
+            "droppedEvents": 0,
+            "startedAt": perf_counter(),
+        }
+
+    # -- State -----------------------------------------------------------------
+
+    def refresh(self) -> WindowSnapshot:
+        # The watcher and any request with a maxAge can get here at once, without
+        #   this a slow take could land on top of a newer one and make windows
+        #   that are still there look destroyed
+        with self.refreshLock:
+            return self.__refresh__()
+
+    def __refresh__(self) -> WindowSnapshot:
+        if self.desktops != None:
+            snapshot = DesktopSnapshot.take(self.desktops)
+        else:
+            snapshot = WindowSnapshot.take()
+        foreground = win32.GetForegroundWindow()
+
+        with self.snapshotLock:
+            previous, previousForeground = self.snapshot, self.foreground
+            self.snapshot, self.foreground = snapshot, foreground
+
+            # Anything that died or got renamed has to be rebuilt next time
+            titles = dict(snapshot.windows)
+            gone: dict[int, Window] = dict()
+            for hwnd in list(self.windowCache):
+                if titles.get(hwnd) != self.windowCache[hwnd].windowTitle:
+                    window = self.windowCache.pop(hwnd)
+                    if hwnd not in titles:
+                        gone[hwnd] = window
+
+        self.stats["refreshes"] += 1
+
+        if previous != None:
+            self.__publishChanges__(
+                previous, snapshot, previousForeground, foreground, gone
+            )
+
+        return snapshot
+
+    def currentSnapshot(self, maxAge: float = None) -> WindowSnapshot:
+        snapshot = self.snapshot
+        if snapshot == None or (maxAge != None and snapshot.age() > maxAge):
+            snapshot = self.refresh()
+
+        return snapshot
+
+    def windowFor(self, hwnd: int, windowText: str = None) -> Window:
+        window = self.windowCache.get(hwnd)
+        if window != None:
+            self.stats["cacheHits"] += 1
+            return window
+
+        self.stats["cacheMisses"] += 1
+        window = getWindowAsObject(hwnd, windowText)
+        self.windowCache[hwnd] = window
+        return window
+
+    def __watch__(self):
+        while not self.stopFlag.wait(self.refreshSeconds):
+            try:
+                self.refresh()
+            except win32.error:
+                # The desktop can be locked or mid switch, just catch it next tick
+                continue
+
+    # -- Subscriptions -----------------------------------------------------------
+
+    def __publish__(self, event: str, window: Window):
+        with self.subscribersLock:
+            subscribers = list(self.subscribers)
+
+        for subscribedTo, keyword, queue in subscribers:
+            if subscribedTo != event:
+                continue
+            if keyword and keyword not in str(window.windowTitle):
+                continue
+
+            try:
+                queue.put_nowait((event, window))
+            except Full:
+                # A client that stopped reading doesn't get to hold us up
+                self.stats["droppedEvents"] += 1
+
+    def __publishChanges__(
+        self,
+        previous: WindowSnapshot,
+        current: WindowSnapshot,
+        previousForeground: int,
+        foreground: int,
+        gone: dict[int, Window],
+    ):
+        "gone: the cached Windows of whatever died this refresh"
+        if not self.subscribers:
+            return
+
+        previousTitles = dict(previous.windows)
+        for hwnd, winText in current.windows:
+            if hwnd not in previous:
+                self.__publish__(EVENT_CREATED, self.windowFor(hwnd, winText))
+
+        for hwnd in previous.hwnds - current.hwnds:
+            window = gone.get(hwnd)
+            if window == None:
+                window = __deadWindow__(hwnd, previousTitles[hwnd])
+
+            self.__publish__(EVENT_DESTROYED, window)
+
+        if foreground != previousForeground and foreground:
+            self.__publish__(EVENT_FOREGROUND, self.windowFor(foreground))
+
+    # -- Operations ----------------------------------------------------------------
+
+    def op_ping(self):
+        return "pong"
+
+    def op_stats(self):
+        snapshot = self.snapshot
+        desktops = None
+        if isinstance(snapshot, DesktopSnapshot):
+            desktops = {
+                name: {
+                    "windows": sum(
+                        1 for desktop in snapshot.desktopOf.values() if desktop == name
+                    ),
+                    "ms": took * 1000,
+                    "error": (
+                        repr(snapshot.errors[name]) if name in snapshot.errors else None
+                    ),
+                }
+                for name, took in snapshot.timings.items()
+            }
+
+        return {
+            **self.stats,
+            "uptime": perf_counter() - self.stats["startedAt"],
+            "windows": len(self.snapshot) if self.snapshot != None else 0,
+            "cachedWindows": len(self.windowCache),
+            "subscribers": len(self.subscribers),
+            "backend": win32.get().name,
+            "errors": getErrorChannel().stats(),
+            "handles": handlePool.stats(),
+            "desktops": desktops,
+        }
+
+    def op_search(self, keyword: str, ignore=None, exact=False, maxAge=None):
+        snapshot = self.currentSnapshot(maxAge)
+        for hwnd, winText in snapshot.matches(keyword, ignore, exact):
+            return self.windowFor(hwnd, winText)
+
+        return None
+
+    def op_searchAll(self, keyword: str, ignore=None, exact=False, maxAge=None):
+        snapshot = self.currentSnapshot(maxAge)
+        return [
+            self.windowFor(hwnd, winText)
+            for hwnd, winText in snapshot.matches(keyword, ignore, exact)
+        ]
+
+    def op_foreground(self):
+        return self.windowFor(win32.GetForegroundWindow())
+
+    def op_activate(self, hwnd: int, withMinimize: bool = False):
+        return self.windowFor(hwnd).tryActivate(withMinimize=withMinimize)
+
+    def op_message(
+        self,
+        hwnd: int,
+        message: int,
+        wParam=None,
+        lParam=None,
+        tryWaitForMessageToProcess: bool = True,
+    ):
+        "Returns isError, same as Window.sendWindowMessage"
+        return self.windowFor(hwnd).sendWindowMessage(
+            message, wParam, lParam, tryWaitForMessageToProcess
+        )
+
+    def __subscribe__(self, connection: Connection, event: str, keyword: str = None):
+        if event not in (EVENT_FOREGROUND, EVENT_CREATED, EVENT_DESTROYED):
+            connection.send(("error", f"Unknown event '{event}'"))
+            return
+
+        queue = Queue(CONTROLLER_SUBSCRIBE_QUEUE)
+        subscription = (event, keyword, queue)
+        with self.subscribersLock:
+            self.subscribers.append(subscription)
+
+        try:
+            connection.send(("ok", event))
+            while not self.stopFlag.is_set():
+                try:
+                    connection.send(("event", queue.get(timeout=self.refreshSeconds)))
+                except Empty:
+                    continue
+
+        except (OSError, EOFError):
+            pass
+
+        finally:
+            with self.subscribersLock:
+                self.subscribers.remove(subscription)
+
+    # -- Plumbing --------------------------------------------------------------
+
+    def __handle__(self, connection: Connection):
+        try:
+            while not self.stopFlag.is_set():
+                op, kwargs = connection.recv()
+                self.stats["requests"] += 1
+
+                if op == "subscribe":
+                    # This connection is a one way stream from here on out
+                    self.__subscribe__(connection, **kwargs)
+                    return
+
+                handler = getattr(self, f"op_{op}", None)
+                if handler == None:
+                    connection.send(("error", f"Unknown op '{op}'"))
+                    continue
+
+                try:
+                    connection.send(("ok", handler(**kwargs)))
+                except (win32.error, TypeError, ValueError) as e:
+                    connection.send(("error", f"{op}: {e}"))
+
+        except (OSError, EOFError):
+            # Client hung up
+            pass
+
+        finally:
+            connection.close()
+
+    def start(self):
+        "Warm everything up and start accepting, returns once we're listening"
+        self.refresh()
+
+        self.__claimAddress__()
+        self.listener = Listener(self.address, authkey=self.authkey)
+        Thread(target=self.__watch__, daemon=True).start()
+        Thread(target=self.__accept__, daemon=True).start()
+
+    def __claimAddress__(self):
+        "Somebody still listening there keeps it, a socket left behind gets removed"
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except (FileNotFoundError, ConnectionRefusedError):
+            if sys.platform != "win32" and os.path.exists(self.address):
+                # Stale socket from a controller that didn't shut down clean
+                os.remove(self.address)
+            return
+        except AuthenticationError:
+            # Alive, just not ours
+            pass
+
+        raise ControllerError(f"Something is already listening on {self.address}")
+
+    def __accept__(self):
+        while not self.stopFlag.is_set():
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                # Closed under us by stop(), or a client that failed the authkey
+                continue
+
+            Thread(target=self.__handle__, args=(connection,), daemon=True).start()
+
+    def serveForever(self):
+        self.start()
+        try:
+            self.stopFlag.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.stopFlag.is_set():
+            return
+
+        self.stopFlag.set()
+        if self.listener != None:
+            self.listener.close()
@@ -0,0 +1,57 @@
+"""
+python -m lib.Controller [--address ADDRESS] [--keyfile PATH] [--simulated WINDOWS] [--desktops NAME ...]
+
+--keyfile is the authkey clients need, made (only readable by you) if it isn't there
+
+--simulated runs against an in memory desktop with that many windows,
+    handy on machines without a desktop (or without Windows)
+--desktops watches those desktops in parallel instead of just ours, with
+    --simulated they get made up and the windows dealt out between them
+"""
+
+from argparse import ArgumentParser
+
+from lib.WindowHandler import useBackend
+from lib.WindowHandler.backends import SimulatedBackend
+from . import (
+    ControllerServer,
+    getAuthkey,
+    CONTROLLER_ADDRESS,
+    CONTROLLER_AUTHKEY_FILE,
+    CONTROLLER_REFRESH_TIME,
+)
+
+
+def main():
+    parser = ArgumentParser(prog="python -m lib.Controller")
+    parser.add_argument("--address", default=CONTROLLER_ADDRESS)
+    parser.add_argument("--keyfile", default=CONTROLLER_AUTHKEY_FILE, metavar="PATH")
+    parser.add_argument("--refresh", type=float, default=CONTROLLER_REFRESH_TIME)
+    parser.add_argument("--simulated", type=int, default=None, metavar="WINDOWS")
+    parser.add_argument("--desktops", nargs="+", default=None, metavar="NAME")
+    args = parser.parse_args()
+
+    if args.simulated != None:
+        desktop = SimulatedBackend()
+        names = args.desktops or ["Default"]
+        for name in names:
+            if name != "Default":
+                desktop.createDesktop(name)
+
+        for i in range(args.simulated):
+            desktop.createWindow(f"Simulated Window {i}", desktop=names[i % len(names)])
+
+        useBackend(desktop)
+
+    server = ControllerServer(
+        args.address,
+        authkey=getAuthkey(args.keyfile),
+        refreshSeconds=args.refresh,
+        desktops=args.desktops,
+    )
+    print(f"Controller listening on {args.address}")
+    server.serveForever()
+
+
+if __name__ == "__main__":
+    main()
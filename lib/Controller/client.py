@@ -0,0 +1,135 @@
+from threading import Lock
+from multiprocessing.connection import Client
+
+from lib.WindowHandler import Window, WIN32_MESSAGE
+from . import CONTROLLER_ADDRESS, ControllerError, getAuthkey
+
+
+class ControllerClient:
+    """
+    The thin side of lib.Controller, one connection reused for every call
+
+    ex: with ControllerClient() as controller:
+            editor = controller.search("Notepad")
+            controller.activate(editor)
+
+    Windows come back as real Window objects (built by the controller), so
+        window.tryActivate() etc still work locally if you want them to
+
+    authkey: None uses the per user key from getAuthkey(), nothing gets unpickled
+        from a server that doesn't know it
+    """
+
+    def __init__(
+        self, address: str = CONTROLLER_ADDRESS, authkey: bytes = None
+    ) -> None:
+        self.address = address
+        self.authkey = authkey if authkey != None else getAuthkey()
+        self.connection = Client(address, authkey=self.authkey)
+        self.lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def call(self, op: str, **kwargs):
+        with self.lock:
+            self.connection.send((op, kwargs))
+            status, value = self.connection.recv()
+
+        if status == "error":
+            raise ControllerError(value)
+
+        return value
+
+    def ping(self) -> str:
+        return self.call("ping")
+
+    def stats(self) -> dict:
+        return self.call("stats")
+
+    def search(
+        self,
+        keyword: str,
+        ignore: list | str = None,
+        exact: bool = False,
+        maxAge: float = None,
+    ) -> Window | None:
+        "maxAge: seconds, how stale the controllers snapshot is allowed to be, None takes whatever it has"
+        return self.call(
+            "search", keyword=keyword, ignore=ignore, exact=exact, maxAge=maxAge
+        )
+
+    def searchAll(
+        self,
+        keyword: str,
+        ignore: list | str = None,
+        exact: bool = False,
+        maxAge: float = None,
+    ) -> list[Window]:
+        return self.call(
+            "searchAll", keyword=keyword, ignore=ignore, exact=exact, maxAge=maxAge
+        )
+
+    def foreground(self) -> Window:
+        return self.call("foreground")
+
+    def activate(self, window: Window | int, withMinimize: bool = False) -> bool:
+        return self.call("activate", hwnd=__hwndOf__(window), withMinimize=withMinimize)
+
+    def sendWindowMessage(
+        self,
+        window: Window | int,
+        message: WIN32_MESSAGE,
+        wParam=None,
+        lParam=None,
+        tryWaitForMessageToProcess: bool = True,
+    ) -> bool:
+        "Returns isError, same as Window.sendWindowMessage"
+        return self.call(
+            "message",
+            hwnd=__hwndOf__(window),
+            message=message,
+            wParam=wParam,
+            lParam=lParam,
+            tryWaitForMessageToProcess=tryWaitForMessageToProcess,
+        )
+
+    def subscribe(self, event: str, keyword: str = None):
+        """
+        Yields Windows as the controller sees them, on its own connection so
+            this client can keep making calls
+
+        event: EVENT_FOREGROUND, EVENT_CREATED or EVENT_DESTROYED
+
+        ex: for window in controller.subscribe(EVENT_CREATED, "Save As"):
+                handle(window)
+        """
+
+        connection = Client(self.address, authkey=self.authkey)
+        try:
+            connection.send(("subscribe", {"event": event, "keyword": keyword}))
+            status, value = connection.recv()
+            if status == "error":
+                raise ControllerError(value)
+
+            while True:
+                try:
+                    _, (_, window) = connection.recv()
+                except EOFError:
+                    # Controller went away
+                    return
+
+                yield window
+
+        finally:
+            connection.close()
+
+
+def __hwndOf__(window: Window | int) -> int:
+    return window if type(window) == int else window.hwnd
@@ -0,0 +1,273 @@
+from time import sleep, perf_counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from lib.WindowHandler import Window
+
+# fmt: off
+EVENT_PRESS   = 1
+EVENT_RELEASE = 2
+EVENT_TEXT    = 3
+# fmt: on
+
+# sleep() is only good to a couple ms on Windows, so we sleep most of the way
+#   there and spin on perf_counter for the rest
+MACRO_SPIN_SECONDS = 0.002
+
+
+class MacroSyntaxError(Exception):
+    def __init__(self, message: str, *args: object) -> None:
+        super().__init__(message, *args)
+
+
+class KeyboardSink:
+    """
+    Sends input through the keyboard package, key names are resolved to scan
+        codes once at compile time instead of on every press
+    """
+
+    def __init__(self) -> None:
+        import keyboard
+
+        self.keyboard = keyboard
+        self.__resolved__ = dict()
+
+    def resolve(self, keyName: str):
+        if keyName not in self.__resolved__:
+            scanCodes = self.keyboard.key_to_scan_codes(keyName)
+            self.__resolved__[keyName] = scanCodes[0]
+
+        return self.__resolved__[keyName]
+
+    def press(self, code):
+        self.keyboard.press(code)
+
+    def release(self, code):
+        self.keyboard.release(code)
+
+    def text(self, text: str):
+        self.keyboard.write(text, delay=0)
+
+
+class FakeSink:
+    """
+    Records what would have been typed, so macros can be tested without a
+        keyboard or a desktop
+
+    events: [(perf_counter(), EVENT_*, code or text)]
+    """
+
+    def __init__(self) -> None:
+        self.events = list()
+
+    def resolve(self, keyName: str):
+        return keyName
+
+    def press(self, code):
+        self.events.append((perf_counter(), EVENT_PRESS, code))
+
+    def release(self, code):
+        self.events.append((perf_counter(), EVENT_RELEASE, code))
+
+    def text(self, text: str):
+        self.events.append((perf_counter(), EVENT_TEXT, text))
+
+    def typed(self) -> str:
+        "Just the text events, glued together"
+        return "".join(value for _, kind, value in self.events if kind == EVENT_TEXT)
+
+
+@dataclass
+class Batch:
+    delayBefore: float = 0.0
+    events: list[tuple[int, object]] = field(default_factory=list)
+    keyCount: int = 0
+
+
+@dataclass
+class PlaybackResult:
+    keysSent: int = 0
+    batchesPlayed: int = 0
+    elapsed: float = 0.0
+    waitSeconds: float = 0.0
+    aborted: bool = False
+    abortedAtBatch: int = None
+
+    @property
+    def keysPerSecond(self) -> float:
+        typingSeconds = self.elapsed - self.waitSeconds
+        if typingSeconds <= 0:
+            return 0.0
+
+        return self.keysSent / typingSeconds
+
+
+def waitUntil(deadline: float):
+    remaining = deadline - perf_counter()
+    if remaining > MACRO_SPIN_SECONDS:
+        sleep(remaining - MACRO_SPIN_SECONDS)
+
+    while perf_counter() < deadline:
+        pass
+
+
+def __parseSequence__(sequence: str) -> list[tuple[str, object]]:
+    """
+    "hello{enter}{wait 0.5}{ctrl+s}" ->
+        [("text", "hello"), ("chord", ["enter"]), ("wait", 0.5), ("chord", ["ctrl", "s"])]
+
+    {{ and }} are literal braces
+    """
+
+    tokens = []
+    text = []
+    i = 0
+
+    def flushText():
+        if text:
+            tokens.append(("text", "".join(text)))
+            text.clear()
+
+    while i < len(sequence):
+        char = sequence[i]
+
+        if sequence.startswith("{{", i) or sequence.startswith("}}", i):
+            text.append(char)
+            i += 2
+            continue
+
+        if char == "}":
+            raise MacroSyntaxError(f"Unmatched '}}' at {i}")
+
+        if char != "{":
+            text.append(char)
+            i += 1
+            continue
+
+        end = sequence.find("}", i)
+        if end == -1:
+            raise MacroSyntaxError(f"Unclosed '{{' at {i}")
+
+        flushText()
+        body = sequence[i + 1 : end].strip()
+        if body == "":
+            raise MacroSyntaxError(f"Empty '{{}}' at {i}")
+
+        if body.startswith("wait "):
+            try:
+                tokens.append(("wait", float(body[len("wait ") :])))
+            except ValueError:
+                raise MacroSyntaxError(f"Bad wait '{body}' at {i}")
+        else:
+            tokens.append(("chord", [key.strip() for key in body.split("+")]))
+
+        i = end + 1
+
+    flushText()
+    return tokens
+
+
+class Macro:
+    """
+    A key sequence compiled once into batches and played back as many times as you like
+
+    ex: macro = Macro("ctrl+a is {ctrl+a}{wait 0.2}{enter}")
+        result = macro.play(window)
+        print(result.keysPerSecond)
+
+    Batches are split on {wait N}, the target window has to be the foreground
+        before each batch goes out, if it isn't (and we can't get it back)
+        playback stops right there
+    """
+
+    def __init__(self, sequence: str, sink=None, keyInterval: float = 0.0) -> None:
+        "keyInterval: seconds between input events inside a batch, 0 sends text runs in one go"
+        self.sequence = sequence
+        self.sink = sink if sink != None else KeyboardSink()
+        self.keyInterval = keyInterval
+        self.batches = self.__compile__(__parseSequence__(sequence))
+
+    def __compile__(self, tokens: list[tuple[str, object]]) -> list[Batch]:
+        batches = [Batch()]
+
+        for kind, value in tokens:
+            batch = batches[-1]
+
+            if kind == "wait":
+                batches.append(Batch(delayBefore=value))
+
+            elif kind == "text":
+                if self.keyInterval > 0:
+                    batch.events.extend((EVENT_TEXT, char) for char in value)
+                else:
+                    batch.events.append((EVENT_TEXT, value))
+                batch.keyCount += len(value)
+
+            elif kind == "chord":
+                codes = [self.sink.resolve(key) for key in value]
+                batch.events.extend((EVENT_PRESS, code) for code in codes)
+                batch.events.extend((EVENT_RELEASE, code) for code in reversed(codes))
+                batch.keyCount += len(codes)
+
+        # A trailing {wait N} still waits, it just doesn't type anything after
+        return [batch for batch in batches if batch.events or batch.delayBefore]
+
+    @property
+    def keyCount(self) -> int:
+        return sum(batch.keyCount for batch in self.batches)
+
+    def __ensureForeground__(self, window: "Window", tryReactivate: bool) -> bool:
+        if window.isForeground():
+            return True
+
+        if not tryReactivate:
+            return False
+
+        return window.tryActivate()
+
+    def play(
+        self, window: "Window" = None, tryReactivate: bool = True
+    ) -> PlaybackResult:
+        """
+        window: anything with isForeground() and tryActivate(), None skips the check
+        """
+
+        ret = PlaybackResult()
+        sink = self.sink
+        start = perf_counter()
+
+        for index, batch in enumerate(self.batches):
+            if batch.delayBefore:
+                waitStart = perf_counter()
+                waitUntil(waitStart + batch.delayBefore)
+                ret.waitSeconds += perf_counter() - waitStart
+
+            needsFocus = window != None and batch.events
+            if needsFocus and not self.__ensureForeground__(window, tryReactivate):
+                ret.aborted = True
+                ret.abortedAtBatch = index
+                break
+
+            nextKeyAt = perf_counter()
+            for kind, value in batch.events:
+                if self.keyInterval > 0:
+                    waitUntil(nextKeyAt)
+
+                if kind == EVENT_PRESS:
+                    sink.press(value)
+                elif kind == EVENT_RELEASE:
+                    sink.release(value)
+                else:
+                    sink.text(value)
+
+                if self.keyInterval > 0:
+                    # From when this one actually went out, a slow send doesn't
+                    #   get made up for by squeezing the next key in early
+                    nextKeyAt = max(nextKeyAt, perf_counter()) + self.keyInterval
+
+            ret.keysSent += batch.keyCount
+            ret.batchesPlayed += 1
+
+        ret.elapsed = perf_counter() - start
+        return ret
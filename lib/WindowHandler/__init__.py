@@ -1,28 +1,84 @@
-# fmt: off
-import os
-from datetime import datetime, timedelta
-from win32con import (
-    # Security Options
-    PROCESS_QUERY_INFORMATION,
-    PROCESS_VM_READ,
-
-    # Process Options
-    PM_NOREMOVE,
-
-    # Window Messages
-    SW_MINIMIZE,
-    SW_MAXIMIZE,
-    WM_CLOSE,
-)
-# fmt: on
+import sys
+from time import monotonic
+from importlib import import_module
 
 HANDLE_ERROR_DESTRUCTIVE = 1
+# Non-destructive, the error goes to lib.WindowHandler.errors (and maybe stderr from there)
 HANDLE_ERROR_STD_OUTPUT = 2
 
-from typing import Callable, Any, Iterable, Mapping, TypeVar
-from pywintypes import error as pywinError
+# typing costs more to import than the rest of this module put together
+from collections.abc import Callable
+
+# Which goes for typing.TYPE_CHECKING too, type checkers treat the bare name the same way
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from pywintypes import error as pywinError
+    from .controls import ControlTree, ControlNode
+
+# Nothing OS specific gets imported until it's used, pywin32 comes in with the
+#   first call through win32, everything below comes in on first access
+# fmt: off
+__lazyAttributes__ = {
+    "pywinError"                    : ("backends", "getPywinError"),
+    "doesWindowExistIsItForeground" : ("managers", None),
+    "watchWindow"                   : ("managers", None),
+    "event_foregroundWindowChanged" : ("managers", None),
+    "event_windowCreated"           : ("managers", None),
+    "searchForWindowsByTitle"       : ("managers", None),
+    "searchForWindowByTitle"        : ("managers", None),
+    "WindowSnapshot"                : ("managers", None),
+    "GeometryTable"                 : ("geometry", None),
+    "getErrorChannel"               : ("errors", None),
+    "setErrorSink"                  : ("errors", None),
+    "handlePool"                    : ("handles", None),
+    "controlTree"                   : ("controls", None),
+    "DesktopSnapshot"               : ("desktops", None),
+    "ForegroundTimeline"            : ("timeline", None),
+}
+__lazySubmodules__ = [
+    "backends", "managers", "geometry", "tracing", "errors", "dispatch", "handles",
+    "controls", "desktops", "timeline",
+]
+# fmt: on
+
+__all__ = [
+    "HANDLE_ERROR_DESTRUCTIVE",
+    "HANDLE_ERROR_STD_OUTPUT",
+    "WIN32_MESSAGE",
+    "ThreadKill",
+    "win32",
+    "BackendProxy",
+    "useBackend",
+    "getBackend",
+    "EventLoop",
+    "State",
+    "Point",
+    "Rect",
+    "EmptyString",
+    "Window",
+    "getForegroundWindowAsObject",
+    "getWindowAsObject",
+    "tryAttachThread",
+    *__lazyAttributes__,
+]
+
+
+def __getattr__(name: str):
+    if name in __lazySubmodules__:
+        return import_module(f".{name}", __name__)
+
+    if name not in __lazyAttributes__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    moduleName, getter = __lazyAttributes__[name]
+    module = import_module(f".{moduleName}", __name__)
+    value = getattr(module, getter)() if getter else getattr(module, name)
+
+    # Only pay for the lookup once
+    globals()[name] = value
+    return value
+
 
-T = TypeVar("T")
 type WIN32_MESSAGE = int
 
 
@@ -31,26 +87,62 @@ class ThreadKill(Exception):
         super().__init__(message, *args)
 
 
-from dataclasses import dataclass, field, fields
 from threading import Thread, Event
 
-from win32api import OpenProcess, CloseHandle
-from win32gui import (
-    GetWindowText,
-    GetForegroundWindow,
-    EnumWindows,  # used in managers
-    SetForegroundWindow,
-    ShowWindow,
-    SendMessage,
-    PostMessage,
-    GetWindowRect,
-    SetWindowPos,
-)
-from win32process import (
-    GetWindowThreadProcessId,
-    AttachThreadInput,
-    GetModuleFileNameEx,
-)
+
+class BackendProxy:
+    """
+    What every OS call goes through, forwards everything to the installed backend
+
+    Nothing is installed until the first call, so importing doesn't touch pywin32
+    """
+
+    def __init__(self) -> None:
+        self.backend = None
+
+    def install(self, backend):
+        previous = self.backend
+        self.backend = backend
+        return previous
+
+    def get(self):
+        if self.backend == None:
+            from .backends import Win32Backend
+
+            self.backend = Win32Backend()
+
+        return self.backend
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+
+# pywin32 by default, see useBackend
+win32 = BackendProxy()
+
+
+def useBackend(backend):
+    """
+    Swap what every OS call goes to, returns whatever was installed before
+
+    ex: from lib.WindowHandler.backends import SimulatedBackend
+        useBackend(SimulatedBackend())
+    """
+
+    # Pooled handles and cached control trees belong to the backend they came from
+    handles = sys.modules.get(f"{__name__}.handles")
+    if handles != None:
+        handles.handlePool.clear()
+
+    controls = sys.modules.get(f"{__name__}.controls")
+    if controls != None:
+        controls.clearControlTrees()
+
+    return win32.install(backend)
+
+
+def getBackend():
+    return win32.get()
 
 
 class EventLoop(Thread):
@@ -70,13 +162,13 @@ class EventLoop(Thread):
 
         self.tick = tick
 
-        self.__stopAt__ = datetime.now() + timedelta(seconds=timeoutSeconds)
+        self.__stopAt__ = monotonic() + timeoutSeconds
         self.stopFlag = Event()
         self.isStopped = self.stopFlag.is_set
         self.didTimeout = False
 
     def __stopCheck__(self):
-        timeoutCheck = datetime.now() >= self.__stopAt__
+        timeoutCheck = monotonic() >= self.__stopAt__
         if timeoutCheck:
             self.didTimeout = True
 
@@ -105,7 +197,7 @@ class State:
     def __init__(
         self,
         inital=None,
-        setHandler: Callable[[T, T], T] = None,
+        setHandler: Callable[[object, object], object] = None,
     ) -> None:
         """
         setHandler: function(curVal, prevVal) -> newValue
@@ -132,27 +224,62 @@ class State:
         self.val = to
 
 
-@dataclass
+# Spelled out by hand instead of @dataclass, dataclasses drags inspect in with
+#   it and that was most of our import time
 class Point:
-    x: int
-    y: int
+    __fields__ = ("x", "y")
+
+    def __init__(self, x: int, y: int) -> None:
+        self.x = x
+        self.y = y
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __eq__(self, value: object) -> bool:
+        if type(value) != Point:
+            return NotImplemented
+
+        return tuple(self) == tuple(value)
+
+    def __repr__(self) -> str:
+        return f"Point(x={self.x!r}, y={self.y!r})"
 
 
-@dataclass
 class Rect:
-    # fmt: off
-    left   : int = -1
-    top    : int = -1
-    right  : int = -1
-    bottom : int = -1
-    # fmt: on
+    __fields__ = ("left", "top", "right", "bottom")
+
+    def __init__(
+        self,
+        # fmt: off
+        left   : int = -1,
+        top    : int = -1,
+        right  : int = -1,
+        bottom : int = -1,
+        # fmt: on
+    ) -> None:
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
 
-    def toPoint(self):
-        raise NotImplementedError("TODO")
+    def toPoint(self) -> Point:
+        "The middle of the rect, where you'd click"
+        return Point((self.left + self.right) // 2, (self.top + self.bottom) // 2)
 
     def __iter__(self):
-        for field in fields(self):
-            yield getattr(self, field.name)
+        for field in self.__fields__:
+            yield getattr(self, field)
+
+    def __eq__(self, value: object) -> bool:
+        if type(value) != Rect:
+            return NotImplemented
+
+        return tuple(self) == tuple(value)
+
+    def __repr__(self) -> str:
+        return f"Rect(left={self.left!r}, top={self.top!r}, right={self.right!r}, bottom={self.bottom!r})"
 
 
 # I like C#'s String.Empty class member a lot
@@ -161,35 +288,65 @@ class EmptyString(str):
         return "__EMPTY_STRING__"
 
 
-@dataclass
 class Window:
-    hwnd: int
-    threadID: int
-    processID: int
-    windowTitle: str = field(default_factory=str)
-    exePath: str = field(default_factory=str)
-    windowRect: Rect = None
+    __fields__ = (
+        "hwnd",
+        "threadID",
+        "processID",
+        "windowTitle",
+        "exePath",
+        "windowRect",
+    )
+
+    def __init__(
+        self,
+        hwnd: int,
+        threadID: int,
+        processID: int,
+        windowTitle: str = "",
+        exePath: str = "",
+        windowRect: Rect = None,
+    ) -> None:
+        self.hwnd = hwnd
+        self.threadID = threadID
+        self.processID = processID
+        self.windowTitle = windowTitle
+        self.exePath = exePath
+        self.windowRect = windowRect
+
+        self.__post_init__()
 
     class HandleManager:
-        def __init__(self, windowObject) -> None:
+        "Borrows from lib.WindowHandler.handles.handlePool, nothing gets closed on exit"
+
+        def __init__(self, windowObject, access: int = None) -> None:
             self.windowObject = windowObject
+            self.access = access
             self.handle = None
+            self.entry = None
 
         def __enter__(self):
+            from .handles import handlePool
+
+            access = self.access
+            if access == None:
+                access = win32.PROCESS_QUERY_INFORMATION | win32.PROCESS_VM_READ
+
             try:
-                self.handle = OpenProcess(
-                    PROCESS_QUERY_INFORMATION | PROCESS_VM_READ,
-                    False,
-                    self.windowObject.processID,
-                )
-            except pywinError as e:
-                __pywinIsError__(e, OpenProcess)
+                self.entry = handlePool.acquire(self.windowObject.processID, access)
+            except win32.error as e:
+                __pywinIsError__(e, win32.OpenProcess)
                 return None
 
+            self.handle = self.entry.handle
             return self.handle
 
         def __exit__(self, *args):
-            CloseHandle(self.handle)
+            from .handles import handlePool
+
+            if self.entry != None:
+                handlePool.release(self.entry)
+                self.entry = None
 
     def __post_init__(self):
 
@@ -197,14 +354,15 @@ class Window:
         #   I'll let you know where the door is.
         #
         # Whoever decided they are different things is not welcome here
-        canGetHandle = self.getHandle()
-        if None != canGetHandle.handle:
-            with self.getHandle() as _handle:
-                self.exePath = GetModuleFileNameEx(_handle, 0)
-                CloseHandle(_handle)
+        with self.getHandle() as _handle:
+            if _handle != None:
+                try:
+                    self.exePath = win32.GetModuleFileNameEx(_handle, 0)
+                except win32.error as e:
+                    __pywinIsError__(e, win32.GetModuleFileNameEx)
 
         if not self.windowTitle:
-            self.windowTitle = GetWindowText(self.hwnd)
+            self.windowTitle = win32.GetWindowText(self.hwnd)
 
         # If we set it to an EmptyString object, when we search our ignore
         #   list for the EmptyString and we can be sure it won't match
@@ -212,19 +370,25 @@ class Window:
             self.windowTitle = EmptyString
 
         try:
-            self.windowRect = Rect(*GetWindowRect(self.hwnd))
-        except pywinError as e:
-            __pywinIsError__(e, GetWindowRect)
+            self.windowRect = Rect(*win32.GetWindowRect(self.hwnd))
+        except win32.error as e:
+            __pywinIsError__(e, win32.GetWindowRect)
             self.windowRect = Rect(None, None, None, None)
 
     def __eq__(self, value: object) -> bool:
         return (self.windowTitle, self.hwnd) == value
 
+    def __repr__(self) -> str:
+        fieldText = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.__fields__
+        )
+        return f"Window({fieldText})"
+
     def __set_window_to_original_pos__(self):
         w = self.windowRect.right - self.windowRect.left
         h = self.windowRect.bottom - self.windowRect.top
 
-        SetWindowPos(
+        win32.SetWindowPos(
             self.hwnd,
             0,
             *list(self.windowRect)[:-2],
@@ -252,15 +416,18 @@ class Window:
         try:
             # By min and max-ing we make sure it truly is on the foreground
             if withMinimize:
-                ShowWindow(self.hwnd, SW_MINIMIZE)  # 6 minimize
-                ShowWindow(self.hwnd, SW_MAXIMIZE)  # 3 maximize
+                win32.ShowWindow(self.hwnd, win32.SW_MINIMIZE)  # 6 minimize
+                win32.ShowWindow(self.hwnd, win32.SW_MAXIMIZE)  # 3 maximize
                 self.__set_window_to_original_pos__()
 
-            SetForegroundWindow(self.hwnd)
-        except pywinError as e:
+            win32.SetForegroundWindow(self.hwnd)
+        except win32.error as e:
             # handle the failed to set foreground error
-            __pywinIsError__(e, SetForegroundWindow)
-            __pywinIsError__(e, ShowWindow)
+            # Only report it once, against whichever one actually failed
+            if e.funcname == win32.ShowWindow.__name__:
+                __pywinIsError__(e, win32.ShowWindow)
+            else:
+                __pywinIsError__(e, win32.SetForegroundWindow)
             return False
 
         # Sometime it takes just a little longer than it should to raise the window
@@ -283,46 +450,64 @@ class Window:
 
         return False
 
-    def getHandle(self):
+    def getHandle(self, access: int = None):
         """
-        Returns a handle in a context manager for disposing
+        Returns a handle in a context manager, out of the handle pool
 
         ex: with window.getHandle() as handle:
                 doUrStuffWith(handle)
 
-        Disposes when outside of block
+        access: defaults to PROCESS_QUERY_INFORMATION | PROCESS_VM_READ
+        Don't close it yourself, it goes back to the pool outside of the block
+        """
+
+        return self.HandleManager(self, access)
+
+    def controlTree(self, **kwargs) -> "ControlTree":
         """
+        Every child control of this window, cached, see lib.WindowHandler.controls
 
-        return self.HandleManager(self)
+        ex: window.controlTree().find(className="Button", title="OK")
+
+        kwarg: maxAge
+        """
+
+        from .controls import controlTree
+
+        return controlTree(self.hwnd, **kwargs)
+
+    def children(self, **kwargs) -> list["ControlNode"]:
+        "The direct child controls, kwarg: maxAge"
+        return self.controlTree(**kwargs).children()
 
     def tryDestroy(self):
-        return self.sendWindowMessage(WM_CLOSE, tryWaitForMessageToProcess=False)
+        return self.sendWindowMessage(win32.WM_CLOSE, tryWaitForMessageToProcess=False)
 
     def sendWindowMessage(
         self,
         message: WIN32_MESSAGE,
-        wParam: Any = None,
-        lParam: Any = None,
+        wParam: object = None,
+        lParam: object = None,
         tryWaitForMessageToProcess: bool = True,
     ):
         isError = False
 
         if tryWaitForMessageToProcess:
             try:
-                SendMessage(self.hwnd, message, wParam, lParam)
+                win32.SendMessage(self.hwnd, message, wParam, lParam)
 
-            except pywinError as e:
-                __pywinIsError__(e, SendMessage)
+            except win32.error as e:
+                __pywinIsError__(e, win32.SendMessage)
                 isError = True
 
             finally:
                 return isError
 
         try:
-            PostMessage(self.hwnd, message, wParam, lParam)
+            win32.PostMessage(self.hwnd, message, wParam, lParam)
 
-        except pywinError as e:
-            __pywinIsError__(e, PostMessage)
+        except win32.error as e:
+            __pywinIsError__(e, win32.PostMessage)
             isError = True
 
         finally:
@@ -330,29 +515,34 @@ class Window:
 
 
 def __pywinIsError__(
-    _pywinError: pywinError, function: Callable, behavior: int = HANDLE_ERROR_STD_OUTPUT
+    _pywinError: "pywinError",
+    function: Callable,
+    behavior: int = HANDLE_ERROR_STD_OUTPUT,
 ):
     # Get the Literal Name of the callable and see if that's our error
-    if _pywinError.funcname != function.__name__:
-        if behavior == HANDLE_ERROR_DESTRUCTIVE:
-            raise _pywinError
-        elif behavior == HANDLE_ERROR_STD_OUTPUT:
-            # A little non-destructive mode too
-            print(_pywinError)
-        else:
-            raise NotImplementedError(f"Unknown option 'behavior={behavior}'")
+    isExpected = _pywinError.funcname == function.__name__
+
+    if not isExpected and behavior == HANDLE_ERROR_DESTRUCTIVE:
+        raise _pywinError
+    elif behavior not in (HANDLE_ERROR_DESTRUCTIVE, HANDLE_ERROR_STD_OUTPUT):
+        raise NotImplementedError(f"Unknown option 'behavior={behavior}'")
+
+    # Printing here used to be most of a search's time on a desktop full of
+    #   elevated processes, so errors get counted and rate limited instead
+    from .errors import errorChannel
 
+    errorChannel.report(_pywinError, function.__name__, isExpected)
     return
 
 
 def getForegroundWindowAsObject():
-    return getWindowAsObject(GetForegroundWindow())
+    return getWindowAsObject(win32.GetForegroundWindow())
 
 
 def getWindowAsObject(hwnd: int, windowText: str = None):
     # GetWindowThreadProcessId returns the threadID and the processID
     #   so we just destructure it
-    return Window(hwnd, *GetWindowThreadProcessId(hwnd), windowText)
+    return Window(hwnd, *win32.GetWindowThreadProcessId(hwnd), windowText)
     #                                                    ^
     #                                          if there is no windowText, oh well
 
@@ -370,10 +560,10 @@ def tryAttachThread(thisThread: int, willBeAttachedToThisThread: int):
     try:
         # No harm in handling it anyway, there is a chance the window will be
         #   raised anyway, but that's on you if it fails
-        AttachThreadInput(thisThread, willBeAttachedToThisThread, True)
+        win32.AttachThreadInput(thisThread, willBeAttachedToThisThread, True)
 
-    except pywinError as e:
-        __pywinIsError__(e, AttachThreadInput)
+    except win32.error as e:
+        __pywinIsError__(e, win32.AttachThreadInput)
         return False
 
     return True
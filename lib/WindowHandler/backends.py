@@ -0,0 +1,512 @@
+from importlib import import_module
+from time import sleep
+from itertools import count
+from threading import RLock
+
+
+class SimulatedPywinError(Exception):
+    "Shaped like pywintypes.error, for when there's no pywin32 around (Linux, CI boxes)"
+
+    def __init__(self, winerror: int, funcname: str, strerror: str) -> None:
+        super().__init__(winerror, funcname, strerror)
+        self.winerror = winerror
+        self.funcname = funcname
+        self.strerror = strerror
+
+
+__pywinError__ = None
+
+
+def getPywinError() -> type[Exception]:
+    "pywintypes.error if we have it, only imported the first time somebody asks"
+    global __pywinError__
+
+    if __pywinError__ == None:
+        try:
+            from pywintypes import error as __pywinError__
+        except ImportError:
+            __pywinError__ = SimulatedPywinError
+
+    return __pywinError__
+
+
+def __getattr__(name: str):
+    if name == "pywinError":
+        return getPywinError()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# fmt: off
+WIN32_FUNCTIONS = {
+    "win32api"     : ["OpenProcess", "CloseHandle"],
+    "win32gui"     : [
+        "GetWindowText", "GetForegroundWindow", "EnumWindows", "SetForegroundWindow",
+        "ShowWindow", "SendMessage", "PostMessage", "GetWindowRect", "SetWindowPos",
+        "IsWindowVisible", "EnumChildWindows", "GetParent", "GetClassName", "GetDlgCtrlID",
+        "EnumDesktopWindows",
+    ],
+    "win32service" : ["OpenDesktop"],
+    "win32process" : [
+        "GetWindowThreadProcessId", "AttachThreadInput", "GetModuleFileNameEx",
+        "GetExitCodeProcess",
+    ],
+}
+
+WIN32_CONSTANTS = [
+    "PROCESS_QUERY_INFORMATION", "PROCESS_VM_READ", "PM_NOREMOVE",
+    "SW_MINIMIZE", "SW_MAXIMIZE", "WM_CLOSE", "WM_SETTEXT", "DESKTOP_READOBJECTS",
+]
+
+# Windows error codes the simulated backend raises
+ERROR_FILE_NOT_FOUND        = 2
+ERROR_ACCESS_DENIED         = 5
+ERROR_INVALID_HANDLE        = 6
+ERROR_INVALID_PARAMETER     = 87
+ERROR_INVALID_WINDOW_HANDLE = 1400
+# fmt: on
+
+
+class Win32Backend:
+    "The real thing, every attribute is straight out of pywin32"
+
+    name = "win32"
+
+    def __init__(self) -> None:
+        self.error = getPywinError()
+
+        for moduleName, functionNames in WIN32_FUNCTIONS.items():
+            module = import_module(moduleName)
+            for functionName in functionNames:
+                setattr(self, functionName, getattr(module, functionName))
+
+        win32con = import_module("win32con")
+        for constant in WIN32_CONSTANTS:
+            setattr(self, constant, getattr(win32con, constant))
+
+    # pywin32 hangs these off the handle objects, not the modules
+
+    def EnumDesktops(self) -> list[str]:
+        "The desktops in our own window station"
+        return list(
+            import_module("win32service").GetProcessWindowStation().EnumDesktops()
+        )
+
+    def CloseDesktop(self, desktop):
+        desktop.CloseDesktop()
+
+
+class SimulatedWindow:
+    def __init__(
+        self,
+        hwnd: int,
+        title: str,
+        threadID: int,
+        processID: int,
+        exePath: str,
+        rect: tuple[int, int, int, int],
+        elevated: bool,
+        visible: bool,
+        className: str = "SimulatedWindow",
+        parent: int = 0,
+        controlID: int = 0,
+        desktop: str = "Default",
+    ) -> None:
+        self.hwnd = hwnd
+        self.title = title
+        self.threadID = threadID
+        self.processID = processID
+        self.exePath = exePath
+        self.rect = rect
+        self.elevated = elevated
+        self.visible = visible
+        self.className = className
+        # 0 for top level windows, they're the ones in the z-order
+        self.parent = parent
+        self.controlID = controlID
+        self.children: list[int] = list()
+        self.desktop = desktop
+
+
+class SimulatedBackend:
+    """
+    An in memory desktop with the same surface as Win32Backend
+
+    ex: desktop = SimulatedBackend()
+        hwnd = desktop.createWindow("Notepad")
+        useBackend(desktop)
+        searchForWindowByTitle("Notepad").hwnd == hwnd
+
+    Windows are kept in z-order, top first, SetForegroundWindow raises to the top
+
+    Child controls hang off a window (or another control) with createControl,
+        they never show up in EnumWindows, only in EnumChildWindows
+
+    Windows live on the "Default" desktop unless createDesktop made another,
+        EnumWindows only sees Default, EnumDesktopWindows sees whichever
+    """
+
+    name = "simulated"
+
+    # fmt: off
+    PROCESS_QUERY_INFORMATION         = 0x0400
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    PROCESS_VM_READ                   = 0x0010
+    PM_NOREMOVE                       = 0x0000
+    SW_MINIMIZE                       = 6
+    SW_MAXIMIZE                       = 3
+    WM_CLOSE                          = 0x0010
+    WM_SETTEXT                        = 0x000C
+    DESKTOP_READOBJECTS               = 0x0001
+    # fmt: on
+
+    def __init__(self) -> None:
+        self.error = getPywinError()
+        self.lock = RLock()
+
+        self.windows: dict[int, SimulatedWindow] = dict()
+        self.zOrder: list[int] = list()
+        self.foreground = 0
+        # handle -> processID, what's open right now, and what it was opened for
+        self.handles: dict[int, int] = dict()
+        self.handleAccess: dict[int, int] = dict()
+        # A process lives as long as it has a window, each life gets its own
+        #   number so a handle from before a pid got reused can tell
+        self.processes: dict[int, int] = dict()
+        self.handleLives: dict[int, int] = dict()
+
+        self.__hwnds__ = count(0x10000, 2)
+        self.__ids__ = count(1000, 4)
+        self.__handles__ = count(0x100, 4)
+        self.__lives__ = count(1)
+
+        # name -> (seconds EnumDesktopWindows takes, can we open it)
+        self.desktops: dict[str, tuple[float, bool]] = {"Default": (0.0, True)}
+        self.desktopHandles: dict[int, str] = dict()
+
+    # -- Desktop control, not part of the win32 surface --------------------
+
+    def createWindow(
+        self,
+        title: str,
+        processID: int = None,
+        exePath: str = None,
+        rect: tuple[int, int, int, int] = (0, 0, 640, 480),
+        elevated: bool = False,
+        foreground: bool = True,
+        visible: bool = True,
+        className: str = "SimulatedWindow",
+        desktop: str = "Default",
+    ) -> int:
+        "Only windows on the Default desktop can be foreground"
+        with self.lock:
+            if desktop not in self.desktops:
+                raise ValueError(
+                    f"No desktop named {desktop!r}, createDesktop it first"
+                )
+
+            hwnd = next(self.__hwnds__)
+            processID = processID if processID != None else next(self.__ids__)
+            exePath = exePath if exePath != None else f"C:\\Simulated\\{processID}.exe"
+
+            self.windows[hwnd] = SimulatedWindow(
+                hwnd,
+                title,
+                next(self.__ids__),
+                processID,
+                exePath,
+                tuple(rect),
+                elevated,
+                visible,
+                className,
+                desktop=desktop,
+            )
+            self.zOrder.insert(0, hwnd)
+            if processID not in self.processes:
+                self.processes[processID] = next(self.__lives__)
+
+            if desktop == "Default" and (foreground or not self.foreground):
+                self.foreground = hwnd
+
+            return hwnd
+
+    def createControl(
+        self,
+        parent: int,
+        className: str = "Button",
+        text: str = "",
+        controlID: int = 0,
+        rect: tuple[int, int, int, int] = None,
+        visible: bool = True,
+    ) -> int:
+        "A child of parent, which can be a window or another control"
+        with self.lock:
+            owner = self.__window__(parent, "CreateWindowEx")
+            hwnd = next(self.__hwnds__)
+
+            self.windows[hwnd] = SimulatedWindow(
+                hwnd,
+                text,
+                owner.threadID,
+                owner.processID,
+                owner.exePath,
+                tuple(rect) if rect != None else owner.rect,
+                owner.elevated,
+                visible,
+                className,
+                parent,
+                controlID,
+                owner.desktop,
+            )
+            owner.children.append(hwnd)
+
+            return hwnd
+
+    def destroyWindow(self, hwnd: int):
+        with self.lock:
+            window = self.windows.pop(hwnd, None)
+            if window == None:
+                return
+
+            # Children go down with their parent, same as DestroyWindow
+            for child in list(window.children):
+                self.destroyWindow(child)
+
+            if window.parent:
+                # Already gone if we're here because the parent is being destroyed
+                owner = self.windows.get(window.parent)
+                if owner != None:
+                    owner.children.remove(hwnd)
+            else:
+                self.zOrder.remove(hwnd)
+
+            if not any(w.processID == window.processID for w in self.windows.values()):
+                self.processes.pop(window.processID, None)
+
+            if self.foreground == hwnd:
+                self.foreground = next(
+                    (h for h in self.zOrder if self.windows[h].desktop == "Default"), 0
+                )
+
+    def createDesktop(self, name: str, latency: float = 0.0, accessible: bool = True):
+        """
+        latency: how long EnumDesktopWindows sits there before answering
+        accessible: False and OpenDesktop is access denied, like Winlogon
+        """
+
+        with self.lock:
+            self.desktops[name] = (latency, accessible)
+
+    def __window__(self, hwnd: int, funcname: str) -> SimulatedWindow:
+        window = self.windows.get(hwnd)
+        if window == None:
+            raise self.error(
+                ERROR_INVALID_WINDOW_HANDLE, funcname, "Invalid window handle."
+            )
+
+        return window
+
+    # -- win32api ------------------------------------------------------------
+
+    def OpenProcess(self, access: int, inherit: bool, processID: int) -> int:
+        with self.lock:
+            owners = [w for w in self.windows.values() if w.processID == processID]
+            if not owners:
+                raise self.error(
+                    ERROR_INVALID_PARAMETER,
+                    "OpenProcess",
+                    "The parameter is incorrect.",
+                )
+
+            if owners[0].elevated:
+                raise self.error(
+                    ERROR_ACCESS_DENIED, "OpenProcess", "Access is denied."
+                )
+
+            handle = next(self.__handles__)
+            self.handles[handle] = processID
+            self.handleAccess[handle] = access
+            self.handleLives[handle] = self.processes[processID]
+            return handle
+
+    def OpenDesktop(self, name: str, flags: int, inherit: bool, access: int) -> int:
+        with self.lock:
+            if name not in self.desktops:
+                raise self.error(
+                    ERROR_FILE_NOT_FOUND,
+                    "OpenDesktop",
+                    "The system cannot find the file specified.",
+                )
+
+            if not self.desktops[name][1]:
+                raise self.error(
+                    ERROR_ACCESS_DENIED, "OpenDesktop", "Access is denied."
+                )
+
+            handle = next(self.__handles__)
+            self.desktopHandles[handle] = name
+            return handle
+
+    def CloseDesktop(self, handle: int):
+        with self.lock:
+            self.desktopHandles.pop(handle, None)
+
+    def EnumDesktops(self) -> list[str]:
+        with self.lock:
+            return list(self.desktops)
+
+    def CloseHandle(self, handle: int):
+        # pywin32 closes a PyHANDLE once and ignores it after, so a double
+        #   close is a no-op here too
+        with self.lock:
+            self.handles.pop(handle, None)
+            self.handleAccess.pop(handle, None)
+            self.handleLives.pop(handle, None)
+
+    # -- win32gui ------------------------------------------------------------
+
+    def GetWindowText(self, hwnd: int) -> str:
+        window = self.windows.get(hwnd)
+        # Same as the real one, a dead hwnd just has no text
+        return window.title if window != None else ""
+
+    def GetForegroundWindow(self) -> int:
+        return self.foreground
+
+    def EnumWindows(self, callback, extra):
+        # Our thread's desktop, which is always Default
+        self.__enumDesktop__("Default", callback, extra)
+
+    def EnumDesktopWindows(self, desktop: int, callback, extra):
+        with self.lock:
+            name = self.desktopHandles.get(desktop)
+            if name == None:
+                raise self.error(
+                    ERROR_INVALID_HANDLE, "EnumDesktopWindows", "The handle is invalid."
+                )
+
+            latency = self.desktops[name][0]
+
+        if latency:
+            # Outside the lock, a slow desktop shouldn't hold up the others
+            sleep(latency)
+
+        self.__enumDesktop__(name, callback, extra)
+
+    def __enumDesktop__(self, name: str, callback, extra):
+        with self.lock:
+            hwnds = [hwnd for hwnd in self.zOrder if self.windows[hwnd].desktop == name]
+
+        for hwnd in hwnds:
+            if callback(hwnd, extra) == False:
+                break
+
+    def SetForegroundWindow(self, hwnd: int):
+        with self.lock:
+            self.__window__(hwnd, "SetForegroundWindow")
+            self.zOrder.remove(hwnd)
+            self.zOrder.insert(0, hwnd)
+            self.foreground = hwnd
+
+    def ShowWindow(self, hwnd: int, command: int):
+        self.__window__(hwnd, "ShowWindow")
+
+    def SendMessage(self, hwnd: int, message: int, wParam=None, lParam=None):
+        with self.lock:
+            window = self.__window__(hwnd, "SendMessage")
+
+            if message == self.WM_CLOSE:
+                self.destroyWindow(hwnd)
+            elif message == self.WM_SETTEXT:
+                window.title = str(lParam)
+
+        return 0
+
+    def PostMessage(self, hwnd: int, message: int, wParam=None, lParam=None):
+        self.__window__(hwnd, "PostMessage")
+        self.SendMessage(hwnd, message, wParam, lParam)
+
+    def GetWindowRect(self, hwnd: int) -> tuple[int, int, int, int]:
+        return self.__window__(hwnd, "GetWindowRect").rect
+
+    def IsWindowVisible(self, hwnd: int) -> bool:
+        window = self.windows.get(hwnd)
+        return window != None and window.visible
+
+    def SetWindowPos(self, hwnd: int, insertAfter: int, x, y, cx, cy, flags):
+        self.__window__(hwnd, "SetWindowPos").rect = (x, y, x + cx, y + cy)
+
+    def EnumChildWindows(self, hwnd: int, callback, extra):
+        "Every descendant, not just the direct children, parents before their children"
+        with self.lock:
+            descendants = []
+            stack = list(reversed(self.__window__(hwnd, "EnumChildWindows").children))
+
+            while stack:
+                child = stack.pop()
+                descendants.append(child)
+                stack.extend(reversed(self.windows[child].children))
+
+        for child in descendants:
+            if callback(child, extra) == False:
+                break
+
+    def GetParent(self, hwnd: int) -> int:
+        return self.__window__(hwnd, "GetParent").parent
+
+    def GetClassName(self, hwnd: int) -> str:
+        return self.__window__(hwnd, "GetClassName").className
+
+    def GetDlgCtrlID(self, hwnd: int) -> int:
+        return self.__window__(hwnd, "GetDlgCtrlID").controlID
+
+    # -- win32process --------------------------------------------------------
+
+    def GetWindowThreadProcessId(self, hwnd: int) -> tuple[int, int]:
+        window = self.windows.get(hwnd)
+        if window == None:
+            return (0, 0)
+
+        return (window.threadID, window.processID)
+
+    def AttachThreadInput(self, attachFrom: int, attachTo: int, attach: bool):
+        if attachFrom == attachTo:
+            raise self.error(
+                ERROR_INVALID_PARAMETER,
+                "AttachThreadInput",
+                "The parameter is incorrect.",
+            )
+
+    def __processAlive__(self, handle: int, funcname: str) -> bool:
+        if handle not in self.handles:
+            raise self.error(ERROR_INVALID_HANDLE, funcname, "The handle is invalid.")
+
+        processID = self.handles[handle]
+        return self.processes.get(processID) == self.handleLives[handle]
+
+    def GetModuleFileNameEx(self, handle: int, module: int) -> str:
+        with self.lock:
+            if self.__processAlive__(handle, "GetModuleFileNameEx"):
+                processID = self.handles[handle]
+
+                for window in self.windows.values():
+                    if window.processID == processID:
+                        return window.exePath
+
+        # The real one can't read modules out of a process that's gone either
+        raise self.error(
+            ERROR_INVALID_HANDLE, "GetModuleFileNameEx", "The handle is invalid."
+        )
+
+    def GetExitCodeProcess(self, handle: int) -> int:
+        with self.lock:
+            # Either query right will do, same as the real one
+            if handle in self.handles and not self.handleAccess[handle] & (
+                self.PROCESS_QUERY_INFORMATION | self.PROCESS_QUERY_LIMITED_INFORMATION
+            ):
+                raise self.error(
+                    ERROR_ACCESS_DENIED, "GetExitCodeProcess", "Access is denied."
+                )
+
+            # 259 is STILL_ACTIVE, the exit code is 0 for everything that's gone
+            return 259 if self.__processAlive__(handle, "GetExitCodeProcess") else 0
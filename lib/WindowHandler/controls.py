@@ -0,0 +1,302 @@
+"""
+The child controls (buttons, edits...) of a top level window, as a tree
+
+ex: tree = dialog.controlTree()           # or controlTree(dialog.hwnd)
+    ok = tree.find(className="Button", title="OK")
+    edits = tree.findAll(className="Edit")
+    tree.find(controlID=1001).text
+
+    for control in dialog.children():
+        control.children  # expanded when you ask
+
+Building a tree is one EnumChildWindows pass plus a GetParent per control.
+    ControlNodes and the class name / control id of each control are only
+    fetched when something asks for them, so a search on controlID never
+    calls GetClassName. Text is always read live, it changes too often to keep
+
+Trees are cached per top level hwnd. Once a tree is older than maxAge the
+    hwnds get enumerated again (cheap, nothing but ints) and the tree is rebuilt
+    if they changed. A control dying under a tree marks it stale right away
+"""
+
+from time import perf_counter
+from threading import Lock
+
+from . import win32, Rect
+from .managers import __makeTitleMatcher__
+
+# fmt: off
+CONTROL_TREE_MAX_AGE = 1.0
+CONTROL_TREE_CACHE   = 64
+# fmt: on
+
+
+class ControlNode:
+    "One control in a ControlTree, the tree's top level window is the root node"
+
+    __fields__ = ("hwnd", "className", "controlID")
+    __slots__ = ("tree", "hwnd")
+
+    def __init__(self, tree: "ControlTree", hwnd: int) -> None:
+        self.tree = tree
+        self.hwnd = hwnd
+
+    @property
+    def parent(self) -> "ControlNode | None":
+        if self.hwnd == self.tree.hwnd:
+            return None
+
+        return self.tree.node(self.tree.parentOf[self.hwnd])
+
+    @property
+    def children(self) -> list["ControlNode"]:
+        return [
+            self.tree.node(child) for child in self.tree.childrenOf.get(self.hwnd, ())
+        ]
+
+    @property
+    def className(self) -> str | None:
+        return self.tree.classNameOf(self.hwnd)
+
+    @property
+    def controlID(self) -> int | None:
+        return self.tree.controlIDOf(self.hwnd)
+
+    @property
+    def text(self) -> str:
+        return win32.GetWindowText(self.hwnd)
+
+    @property
+    def rect(self) -> Rect:
+        try:
+            return Rect(*win32.GetWindowRect(self.hwnd))
+        except win32.error:
+            self.tree.stale = True
+            return Rect(None, None, None, None)
+
+    def walk(self):
+        "Every hwnd under this node, parents before their children, not the node itself"
+        childrenOf = self.tree.childrenOf
+        stack = list(reversed(childrenOf.get(self.hwnd, ())))
+
+        while stack:
+            hwnd = stack.pop()
+            yield hwnd
+            stack.extend(reversed(childrenOf.get(hwnd, ())))
+
+    def findAll(
+        self,
+        className: str = None,
+        title: str = None,
+        controlID: int = None,
+        exact: bool = False,
+        ignore: list | str = None,
+    ) -> list["ControlNode"]:
+        """
+        Everything under this node matching all of the given criteria
+
+        className and controlID have to match exactly, title matches like
+            searchForWindowByTitle does (exact, ignore)
+        """
+
+        return list(self.__search__(className, title, controlID, exact, ignore))
+
+    def find(
+        self,
+        className: str = None,
+        title: str = None,
+        controlID: int = None,
+        exact: bool = False,
+        ignore: list | str = None,
+    ) -> "ControlNode | None":
+        "The first match in tree order, see findAll"
+        return next(self.__search__(className, title, controlID, exact, ignore), None)
+
+    def __search__(self, className, title, controlID, exact, ignore):
+        isMatch = None
+        if title != None:
+            isMatch = __makeTitleMatcher__(title, ignore, exact)
+            if isMatch == None:
+                return
+
+        tree = self.tree
+        hwnds = tree.order if self.hwnd == tree.hwnd else self.walk()
+
+        # Looked up once, going through the backend proxy per control adds up on big trees
+        classNames, controlIDs = tree.classNames, tree.controlIDs
+        getWindowText = win32.GetWindowText
+
+        # Cheapest check first, text is a message to another process
+        for hwnd in hwnds:
+            if controlID != None:
+                found = controlIDs.get(hwnd)
+                if (found if found != None else tree.controlIDOf(hwnd)) != controlID:
+                    continue
+
+            if className != None:
+                found = classNames.get(hwnd)
+                if (found if found != None else tree.classNameOf(hwnd)) != className:
+                    continue
+
+            if isMatch != None and not isMatch(getWindowText(hwnd)):
+                continue
+
+            yield tree.node(hwnd)
+
+    def __eq__(self, value: object) -> bool:
+        if type(value) != ControlNode:
+            return NotImplemented
+
+        return self.hwnd == value.hwnd
+
+    def __hash__(self) -> int:
+        return hash(self.hwnd)
+
+    def __repr__(self) -> str:
+        fieldText = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.__fields__
+        )
+        return f"ControlNode({fieldText})"
+
+
+def __enumerateChildren__(hwnd: int) -> list[int]:
+    found = []
+
+    def enumProc(child: int, accumulator: list):
+        accumulator.append(child)
+
+    try:
+        win32.EnumChildWindows(hwnd, enumProc, found)
+    except win32.error:
+        # The window's gone, so are its children
+        return []
+
+    return found
+
+
+class ControlTree:
+    def __init__(self, hwnd: int, order: list[int] = None) -> None:
+        "order: what EnumChildWindows handed back, if you already have it"
+        self.hwnd = hwnd
+        self.order = order if order != None else __enumerateChildren__(hwnd)
+        self.checkedAt = perf_counter()
+        # Something under us died, rebuild next time whatever the age
+        self.stale = False
+
+        self.parentOf: dict[int, int] = dict()
+        self.childrenOf: dict[int, list[int]] = dict()
+        self.classNames: dict[int, str] = dict()
+        self.controlIDs: dict[int, int] = dict()
+        self.nodes: dict[int, ControlNode] = dict()
+
+        parents = dict()
+        for child in self.order:
+            try:
+                parents[child] = win32.GetParent(child)
+            except win32.error:
+                # Died halfway through, its children get dropped with it
+                continue
+
+        for child, parent in parents.items():
+            if parent != hwnd and parent not in parents:
+                continue
+
+            self.parentOf[child] = parent
+            self.childrenOf.setdefault(parent, []).append(child)
+
+        if len(self.parentOf) != len(self.order):
+            self.order = list(self.parentOf)
+
+        self.root = self.node(hwnd)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, hwnd: int) -> bool:
+        return hwnd in self.parentOf
+
+    def age(self) -> float:
+        return perf_counter() - self.checkedAt
+
+    def node(self, hwnd: int) -> ControlNode:
+        node = self.nodes.get(hwnd)
+        if node == None:
+            node = self.nodes[hwnd] = ControlNode(self, hwnd)
+
+        return node
+
+    def classNameOf(self, hwnd: int) -> str | None:
+        className = self.classNames.get(hwnd)
+        if className == None:
+            try:
+                className = self.classNames[hwnd] = win32.GetClassName(hwnd)
+            except win32.error:
+                self.stale = True
+
+        return className
+
+    def controlIDOf(self, hwnd: int) -> int | None:
+        controlID = self.controlIDs.get(hwnd)
+        if controlID == None:
+            try:
+                controlID = self.controlIDs[hwnd] = win32.GetDlgCtrlID(hwnd)
+            except win32.error:
+                self.stale = True
+
+        return controlID
+
+    def children(self) -> list[ControlNode]:
+        return self.root.children
+
+    def findAll(self, **kwargs) -> list[ControlNode]:
+        "kwargs: className, title, controlID, exact, ignore"
+        return self.root.findAll(**kwargs)
+
+    def find(self, **kwargs) -> ControlNode | None:
+        "kwargs: className, title, controlID, exact, ignore"
+        return self.root.find(**kwargs)
+
+
+# top level hwnd -> ControlTree, oldest first so the cache can drop from the front
+__trees__: dict[int, ControlTree] = dict()
+__treesLock__ = Lock()
+
+
+def controlTree(hwnd: int, maxAge: float = CONTROL_TREE_MAX_AGE) -> ControlTree:
+    """
+    The cached tree for a top level hwnd, built or rebuilt when it has to be
+
+    maxAge: how long a tree is trusted before checking it for changes, 0 checks every time
+    """
+
+    with __treesLock__:
+        tree = __trees__.get(hwnd)
+
+    if tree != None and not tree.stale and tree.age() <= maxAge:
+        return tree
+
+    order = __enumerateChildren__(hwnd)
+    if tree != None and not tree.stale and order == tree.order:
+        # Nothing moved, good for another maxAge
+        tree.checkedAt = perf_counter()
+        return tree
+
+    tree = ControlTree(hwnd, order)
+    with __treesLock__:
+        __trees__.pop(hwnd, None)
+        __trees__[hwnd] = tree
+
+        while len(__trees__) > CONTROL_TREE_CACHE:
+            del __trees__[next(iter(__trees__))]
+
+    return tree
+
+
+def forgetControlTree(hwnd: int):
+    with __treesLock__:
+        __trees__.pop(hwnd, None)
+
+
+def clearControlTrees():
+    with __treesLock__:
+        __trees__.clear()
@@ -0,0 +1,135 @@
+"""
+One snapshot across several desktops, enumerated in parallel
+
+ex: snapshot = DesktopSnapshot.take(["Default", "Robot"])
+    snapshot.search("Notepad")            # everything WindowSnapshot does
+    snapshot.desktopOf[hwnd]              # "Robot"
+    snapshot.onDesktop("Robot")           # a plain WindowSnapshot of just that one
+    snapshot.timings                      # {"Default": 0.0012, "Robot": 0.31}
+    snapshot.errors                       # {"Winlogon": pywinError(5, "OpenDesktop", ...)}
+
+Every desktop gets opened, walked with EnumDesktopWindows and closed on a
+    worker of its own, so a sweep takes about as long as the slowest desktop
+    instead of all of them added up
+
+Only desktops in our own window station, other sessions' can't be opened from here
+"""
+
+from time import perf_counter
+from threading import Lock
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from . import win32, __pywinIsError__
+from .managers import WindowSnapshot, __titledWindows__
+
+DESKTOP_WORKERS = 8
+
+__executor__: ThreadPoolExecutor = None
+__executorLock__ = Lock()
+
+
+def __getExecutor__() -> ThreadPoolExecutor:
+    # Shared and kept around, the controller sweeps every quarter second and
+    #   starting threads every time would cost more than a small desktop does
+    global __executor__
+
+    with __executorLock__:
+        if __executor__ == None:
+            __executor__ = ThreadPoolExecutor(
+                DESKTOP_WORKERS, thread_name_prefix="Desktops"
+            )
+
+        return __executor__
+
+
+def __walkDesktop__(name: str) -> tuple[list[tuple[int, str]], float, Exception]:
+    "(windows, seconds it took, the error if there was one)"
+    start = perf_counter()
+    windows = []
+
+    try:
+        desktop = win32.OpenDesktop(name, 0, False, win32.DESKTOP_READOBJECTS)
+    except win32.error as e:
+        __pywinIsError__(e, win32.OpenDesktop)
+        return (windows, perf_counter() - start, e)
+
+    error = None
+    try:
+        win32.EnumDesktopWindows(desktop, __titledWindows__, windows)
+    except win32.error as e:
+        __pywinIsError__(e, win32.EnumDesktopWindows)
+        error = e
+    finally:
+        win32.CloseDesktop(desktop)
+
+    return (windows, perf_counter() - start, error)
+
+
+class DesktopSnapshot(WindowSnapshot):
+    def __init__(
+        self,
+        windows: list[tuple[int, str]],
+        desktopOf: dict[int, str],
+        timings: dict[str, float] = None,
+        errors: dict[str, Exception] = None,
+        elapsed: float = 0.0,
+        takenAt: float = None,
+    ) -> None:
+        super().__init__(windows, takenAt)
+        self.desktopOf = desktopOf
+        # Per desktop, and for the whole sweep
+        self.timings = timings if timings != None else dict()
+        self.elapsed = elapsed
+        self.errors = errors if errors != None else dict()
+
+    @classmethod
+    def take(
+        cls, desktops: list[str] = None, executor: Executor = None
+    ) -> "DesktopSnapshot":
+        """
+        desktops: names, every desktop in our window station if None
+        executor: run the walks somewhere else, there's a shared pool of DESKTOP_WORKERS otherwise
+
+        Windows are in desktops order, then z-order, a desktop that can't be
+            opened ends up in errors instead of failing the whole thing
+        """
+
+        if desktops == None:
+            desktops = win32.EnumDesktops()
+
+        if executor == None:
+            executor = __getExecutor__()
+
+        start = perf_counter()
+        futures = [executor.submit(__walkDesktop__, name) for name in desktops]
+
+        windows, desktopOf, timings, errors = [], dict(), dict(), dict()
+        for name, future in zip(desktops, futures):
+            found, took, error = future.result()
+
+            timings[name] = took
+            if error != None:
+                errors[name] = error
+
+            for hwnd, winText in found:
+                # Somebody asked for the same desktop twice
+                if hwnd in desktopOf:
+                    continue
+
+                desktopOf[hwnd] = name
+                windows.append((hwnd, winText))
+
+        return cls(windows, desktopOf, timings, errors, perf_counter() - start)
+
+    def onDesktop(self, name: str) -> WindowSnapshot:
+        return WindowSnapshot(
+            [
+                (hwnd, winText)
+                for hwnd, winText in self.windows
+                if self.desktopOf[hwnd] == name
+            ],
+            self.takenAt,
+        )
+
+    def desktops(self) -> list[str]:
+        return list(self.timings)
@@ -0,0 +1,311 @@
+"""
+Getting event callbacks off the polling thread
+
+ex: pool = ThreadPoolDispatcher(workers=2, maxQueue=32, coalesce=True)
+    event_foregroundWindowChanged(onForeground, dispatcher=pool)
+    ...
+    pool.metrics()  # queueDepth, lagMean, dropped, coalesced...
+    pool.close()
+
+maxQueue + overflow is the backpressure:
+    OVERFLOW_BLOCK       the event loop waits for room, nothing gets lost
+    OVERFLOW_DROP_OLDEST the stalest queued event makes room
+    OVERFLOW_DROP_NEWEST the new event is thrown away
+
+coalesce: a new event with the same key as one still queued replaces its
+    arguments instead of queueing again, so flapping only delivers the latest
+debounceSeconds: an event is held until its key has been quiet that long,
+    events without a key are never held. Other keys don't wait on a held one
+"""
+
+from time import monotonic
+from threading import Thread, Condition, Lock
+from collections import deque
+from collections.abc import Callable
+
+# Same as lib.WindowHandler, without importing typing for it
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import asyncio
+
+# fmt: off
+OVERFLOW_BLOCK       = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+
+DISPATCH_MAX_QUEUE = 64
+# fmt: on
+
+
+class DispatchEntry:
+    __slots__ = ("callback", "args", "key", "submittedAt", "readyAt")
+
+    def __init__(
+        self, callback: Callable, args: tuple, key, now: float, readyAt: float
+    ):
+        self.callback = callback
+        self.args = args
+        self.key = key
+        self.submittedAt = now
+        self.readyAt = readyAt
+
+
+class Dispatcher:
+    "Runs callbacks right where they're submitted, which is what the event loops always did"
+
+    def __init__(self) -> None:
+        self.submitted = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.lastError: Exception = None
+
+        self.lagTotal = 0.0
+        self.lagMax = 0.0
+        self.maxQueueDepth = 0
+        self.metricsLock = Lock()
+
+    def submit(self, callback: Callable, *args, key=None):
+        self.submitted += 1
+        self.__run__(DispatchEntry(callback, args, key, monotonic(), 0.0))
+
+    def __run__(self, entry: DispatchEntry):
+        lag = monotonic() - entry.submittedAt
+        with self.metricsLock:
+            self.lagTotal += lag
+            self.lagMax = max(self.lagMax, lag)
+            self.dispatched += 1
+
+        try:
+            return entry.callback(*entry.args)
+        except Exception as e:
+            # One bad callback shouldn't take the dispatcher down with it
+            with self.metricsLock:
+                self.failed += 1
+                self.lastError = e
+
+    def queueDepth(self) -> int:
+        return 0
+
+    def metrics(self) -> dict:
+        return {
+            "queueDepth": self.queueDepth(),
+            "maxQueueDepth": self.maxQueueDepth,
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "lagMean": self.lagTotal / self.dispatched if self.dispatched else 0.0,
+            "lagMax": self.lagMax,
+        }
+
+    def close(self, wait: bool = True):
+        return
+
+
+InlineDispatcher = Dispatcher
+
+
+class QueuedDispatcher(Dispatcher):
+    "The bounded queue, coalescing and debouncing, subclasses decide who runs the callbacks"
+
+    def __init__(
+        self,
+        maxQueue: int = DISPATCH_MAX_QUEUE,
+        overflow: str = OVERFLOW_BLOCK,
+        coalesce: bool = False,
+        debounceSeconds: float = 0.0,
+    ) -> None:
+        super().__init__()
+
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST):
+            raise ValueError(f"Unknown option 'overflow={overflow}'")
+
+        self.maxQueue = maxQueue
+        self.overflow = overflow
+        self.coalesce = coalesce
+        self.debounceSeconds = debounceSeconds
+
+        self.queue: deque[DispatchEntry] = deque()
+        self.pending: dict[object, DispatchEntry] = dict()
+        self.condition = Condition()
+        self.closed = False
+
+    def queueDepth(self) -> int:
+        return len(self.queue)
+
+    def submit(self, callback: Callable, *args, key=None):
+        now = monotonic()
+        # Coalescing and debouncing both need a key, no key means every event stands alone
+        keyed = key != None and (self.coalesce or self.debounceSeconds > 0)
+        readyAt = now + self.debounceSeconds if key != None else now
+
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Dispatcher is closed")
+
+            self.submitted += 1
+
+            entry = self.pending.get(key) if keyed else None
+            if entry != None:
+                entry.callback, entry.args, entry.submittedAt = callback, args, now
+                entry.readyAt = readyAt
+                self.coalesced += 1
+                self.condition.notify_all()
+                return
+
+            while len(self.queue) >= self.maxQueue:
+                if self.overflow == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return
+
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    self.__forget__(self.queue.popleft())
+                    self.dropped += 1
+                    continue
+
+                # OVERFLOW_BLOCK, this is the backpressure
+                self.condition.wait()
+                if self.closed:
+                    raise RuntimeError("Dispatcher is closed")
+
+            entry = DispatchEntry(callback, args, key, now, readyAt)
+            self.queue.append(entry)
+            if keyed:
+                self.pending[key] = entry
+
+            self.maxQueueDepth = max(self.maxQueueDepth, len(self.queue))
+            self.condition.notify_all()
+
+        self.__wake__()
+
+    def __forget__(self, entry: DispatchEntry):
+        if entry.key != None and self.pending.get(entry.key) is entry:
+            del self.pending[entry.key]
+
+    def __takeReady__(self) -> tuple[DispatchEntry | None, float | None]:
+        "Call holding the condition, returns (entry, None) or (None, seconds until the head is ready)"
+        if not self.queue:
+            return (None, None)
+
+        # The first ready one in submission order, not just the head, a key that
+        #   keeps getting debounced again would hold everything behind it otherwise
+        now = monotonic()
+        soonest = None
+        for index, entry in enumerate(self.queue):
+            if entry.readyAt <= now:
+                del self.queue[index]
+                self.__forget__(entry)
+                # Somebody might be blocked on a full queue
+                self.condition.notify_all()
+                return (entry, None)
+
+            if soonest == None or entry.readyAt < soonest:
+                soonest = entry.readyAt
+
+        return (None, soonest - now)
+
+    def __wake__(self):
+        return
+
+
+class ThreadPoolDispatcher(QueuedDispatcher):
+    def __init__(self, workers: int = 1, **kwargs) -> None:
+        "kwargs: maxQueue, overflow, coalesce, debounceSeconds"
+        super().__init__(**kwargs)
+
+        self.workers = [
+            Thread(target=self.__work__, name=f"Dispatcher-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def __work__(self):
+        while True:
+            with self.condition:
+                entry, remaining = self.__takeReady__()
+                while entry == None:
+                    if self.closed and not self.queue:
+                        return
+
+                    self.condition.wait(remaining)
+                    entry, remaining = self.__takeReady__()
+
+            self.__run__(entry)
+
+    def close(self, wait: bool = True):
+        "wait: let whatever is queued run first"
+        with self.condition:
+            self.closed = True
+            if not wait:
+                self.dropped += len(self.queue)
+                self.queue.clear()
+                self.pending.clear()
+
+            self.condition.notify_all()
+
+        for worker in self.workers:
+            worker.join()
+
+
+class AsyncioDispatcher(QueuedDispatcher):
+    """
+    Callbacks run on an asyncio loop, coroutine functions get scheduled as tasks
+
+    ex: dispatcher = AsyncioDispatcher(asyncio.get_running_loop(), coalesce=True)
+    """
+
+    def __init__(self, loop: "asyncio.AbstractEventLoop", **kwargs) -> None:
+        "kwargs: maxQueue, overflow, coalesce, debounceSeconds"
+        # Only the asyncio flavour pays for importing asyncio
+        import asyncio
+
+        super().__init__(**kwargs)
+        self.asyncio = asyncio
+        self.loop = loop
+        self.tasks: set["asyncio.Task"] = set()
+
+    def __wake__(self):
+        self.loop.call_soon_threadsafe(self.__drain__)
+
+    def __drain__(self):
+        while True:
+            with self.condition:
+                entry, remaining = self.__takeReady__()
+
+            if entry == None:
+                if remaining != None:
+                    self.loop.call_later(remaining, self.__drain__)
+                return
+
+            result = self.__run__(entry)
+            if self.asyncio.iscoroutine(result):
+                task = self.loop.create_task(result)
+                # Hang on to it or it can get garbage collected mid flight
+                self.tasks.add(task)
+                task.add_done_callback(self.__taskDone__)
+
+    def __taskDone__(self, task: "asyncio.Task"):
+        self.tasks.discard(task)
+        if task.cancelled():
+            return
+
+        # The callback returned straight away, a coroutine fails later than __run__ can see
+        error = task.exception()
+        if error != None:
+            with self.metricsLock:
+                self.failed += 1
+                self.lastError = error
+
+    def close(self, wait: bool = True):
+        with self.condition:
+            self.closed = True
+            if not wait:
+                self.dropped += len(self.queue)
+                self.queue.clear()
+                self.pending.clear()
+
+            self.condition.notify_all()
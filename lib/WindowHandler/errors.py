@@ -0,0 +1,155 @@
+"""
+Where pywin errors go instead of stdout
+
+Every error __pywinIsError__ sees is counted and kept in a small ring buffer,
+    unexpected ones (the error came from somewhere other than the function we
+    were calling) also go to the sink, at most once per rateLimitSeconds for
+    the same (function, error)
+
+ex: channel = getErrorChannel()
+    channel.recent[-5:]
+    channel.counters["OpenProcess"]
+
+    setErrorSink(None)                        # quiet
+    setErrorSink(lambda record: log(record))  # yours
+
+Nothing in here is touched until the first error, the success path costs nothing
+"""
+
+import sys
+from time import monotonic
+from threading import Lock
+from collections import deque
+from collections.abc import Callable
+
+ERROR_RING_CAPACITY = 256
+ERROR_RATE_LIMIT_SECONDS = 5.0
+
+
+class ErrorRecord:
+    __slots__ = (
+        "at",
+        "function",
+        "winerror",
+        "funcname",
+        "strerror",
+        "expected",
+        "suppressed",
+    )
+
+    def __init__(
+        self,
+        at: float,
+        function: str,
+        winerror: int,
+        funcname: str,
+        strerror: str,
+        expected: bool,
+    ) -> None:
+        self.at = at
+        self.function = function
+        self.winerror = winerror
+        self.funcname = funcname
+        self.strerror = strerror
+        self.expected = expected
+        # How many identical errors the rate limiter swallowed before this one
+        self.suppressed = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"ErrorRecord({self.function}: ({self.winerror}, {self.funcname!r}, {self.strerror!r})"
+            f"{', expected' if self.expected else ''})"
+        )
+
+
+def stderrSink(record: ErrorRecord):
+    suppressed = f" (+{record.suppressed} suppressed)" if record.suppressed else ""
+    print(
+        f"{record.function}: ({record.winerror}, {record.funcname!r}, {record.strerror!r}){suppressed}",
+        file=sys.stderr,
+    )
+
+
+class ErrorChannel:
+    def __init__(
+        self,
+        capacity: int = ERROR_RING_CAPACITY,
+        rateLimitSeconds: float = ERROR_RATE_LIMIT_SECONDS,
+        sink: Callable[[ErrorRecord], None] = stderrSink,
+    ) -> None:
+        self.recent: deque[ErrorRecord] = deque(maxlen=capacity)
+        self.counters: dict[str, int] = dict()
+        self.rateLimitSeconds = rateLimitSeconds
+        self.sink = sink
+
+        self.emitted = 0
+        self.suppressed = 0
+        self.lock = Lock()
+
+        # (function, winerror, funcname) -> [last emitted at, suppressed since]
+        self.__lastEmitted__: dict[tuple, list] = dict()
+
+    def report(self, error: Exception, function: str, expected: bool) -> ErrorRecord:
+        now = monotonic()
+        record = ErrorRecord(
+            now,
+            function,
+            getattr(error, "winerror", None),
+            getattr(error, "funcname", None),
+            getattr(error, "strerror", str(error)),
+            expected,
+        )
+
+        with self.lock:
+            self.recent.append(record)
+            self.counters[function] = self.counters.get(function, 0) + 1
+
+            if expected or self.sink == None:
+                return record
+
+            key = (function, record.winerror, record.funcname)
+            last = self.__lastEmitted__.get(key)
+            if last != None and now - last[0] < self.rateLimitSeconds:
+                last[1] += 1
+                self.suppressed += 1
+                return record
+
+            record.suppressed = last[1] if last != None else 0
+            self.__lastEmitted__[key] = [now, 0]
+            self.emitted += 1
+            sink = self.sink
+
+        # Outside the lock, a slow sink shouldn't hold up other threads' errors
+        sink(record)
+        return record
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "recent": len(self.recent),
+                "emitted": self.emitted,
+                "suppressed": self.suppressed,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.recent.clear()
+            self.counters.clear()
+            self.__lastEmitted__.clear()
+            self.emitted = 0
+            self.suppressed = 0
+
+
+errorChannel = ErrorChannel()
+
+
+def getErrorChannel() -> ErrorChannel:
+    return errorChannel
+
+
+def setErrorSink(sink: Callable[[ErrorRecord], None] | None):
+    "None drops everything on the floor, counters and the ring buffer still fill up"
+    previous = errorChannel.sink
+    errorChannel.sink = sink
+    return previous
@@ -0,0 +1,177 @@
+from . import win32, Rect, Point
+from .managers import WindowSnapshot
+
+# Points get hit tested in chunks so a big batch doesn't build a
+#   (points x windows) mask the size of the moon, small enough to stay in cache
+GEOMETRY_POINT_CHUNK = 256
+
+
+def __numpy__():
+    # numpy is only needed once somebody actually builds a table
+    import numpy
+
+    return numpy
+
+
+def __everyWindow__(hwnd: int, accumulator: list):
+    "An EnumWindows callback, titled or not"
+    accumulator.append(hwnd)
+
+
+class GeometryTable:
+    """
+    Every window's rect from one snapshot, kept as numpy arrays in z-order
+        (row 0 is the top of the stack) so point and region queries are
+        a handful of array ops instead of a python loop per window
+
+    ex: table = GeometryTable.fromSnapshot()
+        table.windowAt(100, 200)
+        table.windowsAt([(100, 200), (5, 5)])
+        table.overlapping(Rect(0, 0, 800, 600))
+        table.isOccluded(editor.hwnd)
+
+    Rects are Windows style, left/top inclusive and right/bottom exclusive
+    """
+
+    def __init__(self, hwnds, rects) -> None:
+        "hwnds: top of the z-order first, rects: (left, top, right, bottom) for each"
+        np = __numpy__()
+
+        self.hwnds = np.asarray(hwnds, dtype=np.int64)
+        # Screen coordinates fit in 32 bits, and half the bytes is about half the time
+        self.rects = np.asarray(rects, dtype=np.int32).reshape(-1, 4)
+
+        if len(self.hwnds) != len(self.rects):
+            raise ValueError(f"{len(self.hwnds)} hwnds but {len(self.rects)} rects")
+
+        # One contiguous array per edge, slicing columns out of rects is strided
+        #   and that alone made hit testing ~8x slower
+        self.left, self.top, self.right, self.bottom = np.ascontiguousarray(
+            self.rects.T
+        )
+
+        # hwnd -> z index, the only per window python object we keep
+        self.zIndex = {int(hwnd): index for index, hwnd in enumerate(self.hwnds)}
+
+    @classmethod
+    def fromSnapshot(
+        cls, snapshot: WindowSnapshot = None, visibleOnly: bool = True
+    ) -> "GeometryTable":
+        """
+        EnumWindows is already top to bottom z-order, snapshots keep that order
+
+        snapshot: only its windows, which leaves out the untitled ones. None walks
+            every top level window, untitled ones cover things up just the same
+        visibleOnly: hidden windows still have rects, they just aren't "at" anywhere
+        """
+
+        if snapshot != None:
+            candidates = [hwnd for hwnd, _ in snapshot.windows]
+        else:
+            candidates = []
+            win32.EnumWindows(__everyWindow__, candidates)
+
+        hwnds, rects = [], []
+        for hwnd in candidates:
+            try:
+                if visibleOnly and not win32.IsWindowVisible(hwnd):
+                    continue
+
+                rects.append(tuple(win32.GetWindowRect(hwnd)))
+            except win32.error:
+                # Died between the snapshot and now
+                continue
+
+            hwnds.append(hwnd)
+
+        return cls(hwnds, rects)
+
+    def __len__(self) -> int:
+        return len(self.hwnds)
+
+    def __contains__(self, hwnd: int) -> bool:
+        return hwnd in self.zIndex
+
+    def rectOf(self, hwnd: int) -> Rect:
+        return Rect(*(int(edge) for edge in self.rects[self.zIndex[hwnd]]))
+
+    def windowsAt(self, points):
+        """
+        Top most hwnd under each point, 0 where there's nothing
+
+        points: [(x, y), ...] or an (n, 2) array, returns an int64 array
+        """
+
+        np = __numpy__()
+        points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+        found = np.zeros(len(points), dtype=np.int64)
+
+        if len(self.hwnds) == 0:
+            return found
+
+        left, top, right, bottom = self.left, self.top, self.right, self.bottom
+
+        for start in range(0, len(points), GEOMETRY_POINT_CHUNK):
+            chunk = points[start : start + GEOMETRY_POINT_CHUNK]
+            x, y = chunk[:, 0:1], chunk[:, 1:2]
+
+            # (points, windows), True where the window contains the point
+            inside = (x >= left) & (x < right) & (y >= top) & (y < bottom)
+
+            # argmax hands back the first True, which is the top most window
+            topMost = inside.argmax(axis=1)
+            hit = inside[np.arange(len(chunk)), topMost]
+            found[start : start + len(chunk)] = np.where(hit, self.hwnds[topMost], 0)
+
+        return found
+
+    def windowAt(self, x: int, y: int) -> int | None:
+        hwnd = int(self.windowsAt([(x, y)])[0])
+        return hwnd if hwnd else None
+
+    def windowAtPoint(self, point: Point) -> int | None:
+        return self.windowAt(point.x, point.y)
+
+    def __overlapMask__(self, rect):
+        left, top, right, bottom = rect
+
+        return (
+            (self.left < right)
+            & (self.right > left)
+            & (self.top < bottom)
+            & (self.bottom > top)
+        )
+
+    def overlapping(self, rect: Rect | tuple) -> list[int]:
+        "Every hwnd whose rect shares some area with rect, top most first"
+        return [int(hwnd) for hwnd in self.hwnds[self.__overlapMask__(tuple(rect))]]
+
+    def occludedBy(self, hwnd: int) -> list[int]:
+        "hwnds above this one that cover some of it, top most first"
+        index = self.zIndex[hwnd]
+        above = self.__overlapMask__(tuple(self.rects[index]))[:index]
+
+        return [int(other) for other in self.hwnds[:index][above]]
+
+    def isOccluded(self, hwnd: int, fully: bool = False) -> bool:
+        """
+        fully=False: anything at all on top of it
+        fully=True : a single window above covers the whole thing
+        """
+
+        index = self.zIndex[hwnd]
+        if index == 0:
+            return False
+
+        left, top, right, bottom = self.rects[index]
+
+        if not fully:
+            return bool(self.__overlapMask__((left, top, right, bottom))[:index].any())
+
+        covers = (
+            (self.left[:index] <= left)
+            & (self.top[:index] <= top)
+            & (self.right[:index] >= right)
+            & (self.bottom[:index] >= bottom)
+        )
+        return bool(covers.any())
@@ -0,0 +1,248 @@
+"""
+Process handles kept open and reused, instead of OpenProcess/CloseHandle every time
+
+ex: with window.getHandle() as handle:   # goes through handlePool
+        ...
+
+    handlePool.stats()  # open handles, hits, misses...
+
+A pooled handle is reused when it already has every access right asked for,
+    otherwise a new one is opened with the union of both (always including
+    PROCESS_QUERY_LIMITED_INFORMATION). Before a handle is
+    handed out again we check the process is still running, a pid that got
+    reused by a new process would otherwise answer for the old one
+
+Access denied (elevated processes, mostly) is remembered per pid for as long
+    as an idle handle would be kept, so searching past one doesn't ask again
+    for every window it owns. invalidate() forgets it straight away
+
+Idle handles get closed from acquire() and from a timer, so they don't stay
+    open once nobody's asking for handles anymore
+"""
+
+from time import monotonic
+from threading import Lock, Timer
+
+from . import win32
+
+# GetExitCodeProcess hands this back while the process is running
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+# Every pooled handle gets it on top of what was asked for, it's what
+#   GetExitCodeProcess needs to tell us the process is still there
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+HANDLE_IDLE_SECONDS = 30.0
+# How often acquire() bothers looking for idle handles, and the shortest the timer waits
+HANDLE_SWEEP_SECONDS = 5.0
+
+
+class PooledHandle:
+    __slots__ = (
+        "backend",
+        "processID",
+        "handle",
+        "access",
+        "refs",
+        "lastUsed",
+        "retired",
+    )
+
+    def __init__(self, backend, processID: int, handle, access: int) -> None:
+        # Whoever opened it closes it, even if useBackend happened in between
+        self.backend = backend
+        self.processID = processID
+        self.handle = handle
+        self.access = access
+        self.refs = 0
+        self.lastUsed = monotonic()
+        # Replaced or invalidated while somebody was still using it, closed on release
+        self.retired = False
+
+
+class DeniedProcess:
+    __slots__ = ("backend", "access", "error", "deniedAt")
+
+    def __init__(self, backend, access: int, error: Exception, deniedAt: float) -> None:
+        self.backend = backend
+        # Anything asking for at least this much gets the same answer
+        self.access = access
+        self.error = error
+        self.deniedAt = deniedAt
+
+
+class ProcessHandlePool:
+    def __init__(
+        self,
+        idleSeconds: float = HANDLE_IDLE_SECONDS,
+        sweepSeconds: float = HANDLE_SWEEP_SECONDS,
+    ) -> None:
+        self.idleSeconds = idleSeconds
+        self.sweepSeconds = sweepSeconds
+        self.entries: dict[int, PooledHandle] = dict()
+        self.inUse: set[PooledHandle] = set()
+        self.denied: dict[int, DeniedProcess] = dict()
+        self.lock = Lock()
+        self.lastSweep = monotonic()
+        self.sweeper: Timer = None
+
+        self.hits = 0
+        self.misses = 0
+        self.denials = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __close__(self, entry: PooledHandle):
+        try:
+            entry.backend.CloseHandle(entry.handle)
+        except entry.backend.error:
+            # Nothing useful to do about a handle that won't close
+            pass
+
+    def __isAlive__(self, entry: PooledHandle) -> bool:
+        try:
+            return entry.backend.GetExitCodeProcess(entry.handle) == STILL_ACTIVE
+        except entry.backend.error:
+            return False
+
+    def acquire(self, processID: int, access: int) -> PooledHandle:
+        "Raises whatever OpenProcess raises, release() what you get back"
+        with self.lock:
+            now = monotonic()
+            if now - self.lastSweep >= self.sweepSeconds:
+                self.__evictIdle__(now)
+
+            entry = self.entries.get(processID)
+            if entry != None and not self.__isAlive__(entry):
+                self.__retire__(entry)
+                self.invalidations += 1
+                entry = None
+
+            if entry != None and entry.access & access == access:
+                self.hits += 1
+            else:
+                wantedAccess = access | PROCESS_QUERY_LIMITED_INFORMATION
+                if entry != None:
+                    wantedAccess |= entry.access
+
+                backend = win32.get()
+                denied = self.denied.get(processID)
+                if denied != None and (
+                    denied.backend is not backend
+                    or now - denied.deniedAt >= self.idleSeconds
+                ):
+                    del self.denied[processID]
+                    denied = None
+
+                if denied != None and wantedAccess & denied.access == denied.access:
+                    self.denials += 1
+                    raise denied.error.with_traceback(None)
+
+                self.misses += 1
+                try:
+                    handle = backend.OpenProcess(wantedAccess, False, processID)
+                except backend.error as e:
+                    if getattr(e, "winerror", None) == ERROR_ACCESS_DENIED:
+                        self.denied[processID] = DeniedProcess(
+                            backend, wantedAccess, e, now
+                        )
+                    raise
+
+                if entry != None:
+                    self.__retire__(entry)
+
+                entry = PooledHandle(backend, processID, handle, wantedAccess)
+                self.entries[processID] = entry
+
+            entry.refs += 1
+            entry.lastUsed = now
+            self.inUse.add(entry)
+            return entry
+
+    def release(self, entry: PooledHandle):
+        with self.lock:
+            entry.refs -= 1
+            entry.lastUsed = monotonic()
+
+            if entry.refs <= 0:
+                self.inUse.discard(entry)
+                if entry.retired:
+                    self.__close__(entry)
+                else:
+                    self.__scheduleSweep__()
+
+    def __retire__(self, entry: PooledHandle):
+        "Call holding the lock"
+        if self.entries.get(entry.processID) is entry:
+            del self.entries[entry.processID]
+
+        entry.retired = True
+        if entry.refs <= 0:
+            self.__close__(entry)
+
+    def __evictIdle__(self, now: float):
+        self.lastSweep = now
+        for entry in list(self.entries.values()):
+            if entry.refs <= 0 and now - entry.lastUsed >= self.idleSeconds:
+                self.__retire__(entry)
+                self.evictions += 1
+
+        for processID, denied in list(self.denied.items()):
+            if now - denied.deniedAt >= self.idleSeconds:
+                del self.denied[processID]
+
+    def __scheduleSweep__(self):
+        "Call holding the lock, idle handles get closed even if acquire() is never called again"
+        if self.sweeper != None:
+            return
+
+        if not any(entry.refs <= 0 for entry in self.entries.values()):
+            return
+
+        self.sweeper = Timer(max(self.idleSeconds, self.sweepSeconds), self.__sweep__)
+        self.sweeper.daemon = True
+        self.sweeper.start()
+
+    def __sweep__(self):
+        with self.lock:
+            self.sweeper = None
+            self.__evictIdle__(monotonic())
+            self.__scheduleSweep__()
+
+    def evictIdle(self):
+        with self.lock:
+            self.__evictIdle__(monotonic())
+
+    def invalidate(self, processID: int):
+        "The process is gone (or about to be), don't hand its handle out again"
+        with self.lock:
+            self.denied.pop(processID, None)
+            entry = self.entries.get(processID)
+            if entry != None:
+                self.__retire__(entry)
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.denied.clear()
+            for entry in list(self.entries.values()):
+                self.__retire__(entry)
+
+    def openHandles(self) -> int:
+        with self.lock:
+            # Pooled ones plus retired ones somebody is still holding
+            return len(self.entries) + sum(1 for entry in self.inUse if entry.retired)
+
+    def stats(self) -> dict:
+        return {
+            "open": self.openHandles(),
+            "pooled": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "denials": self.denials,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+handlePool = ProcessHandlePool()
@@ -1,7 +1,29 @@
-from . import *
-
-from threading import Thread
-from time import sleep
+from collections.abc import Callable
+from time import sleep, perf_counter
+
+from . import (
+    win32,
+    EventLoop,
+    State,
+    EmptyString,
+    Window,
+    getForegroundWindowAsObject,
+    getWindowAsObject,
+)
+
+__all__ = [
+    "QUICK_EVENT_TRY_MAX_ITERATIONS",
+    "QUICK_EVENT_RETRY_TIME",
+    "EVENT_TRY_MAX_ITERATIONS",
+    "EVENT_RETRY_TIME",
+    "doesWindowExistIsItForeground",
+    "watchWindow",
+    "event_foregroundWindowChanged",
+    "event_windowCreated",
+    "searchForWindowsByTitle",
+    "searchForWindowByTitle",
+    "WindowSnapshot",
+]
 
 QUICK_EVENT_TRY_MAX_ITERATIONS = 2
 QUICK_EVENT_RETRY_TIME = 0.2
@@ -52,16 +74,32 @@ def watchWindow(windowSearchArgs: list, time: int, maxIter: int):
     return haveWindow
 
 
+def __dispatch__(dispatcher, callback: Callable[[Window], None], window: Window, key):
+    # No dispatcher is the old behaviour, the callback runs right here on the EventLoop
+    if dispatcher == None:
+        callback(window)
+        return
+
+    dispatcher.submit(callback, window, key=key)
+
+
 def event_foregroundWindowChanged(
-    callback: Callable[[Window], None], timeout: int = 10
+    callback: Callable[[Window], None], timeout: int = 10, dispatcher=None
 ):
+    """
+    dispatcher: a lib.WindowHandler.dispatch Dispatcher to run callback on,
+        events are keyed "foreground" so coalescing keeps only the latest
+    """
+
     curForeground = State(getForegroundWindowAsObject())
 
     def eventTick():
         newCurFore = getForegroundWindowAsObject()
 
         if newCurFore != curForeground.val:
-            callback(newCurFore)
+            # Move the baseline along or every tick after this counts as a change too
+            curForeground.setVal(newCurFore)
+            __dispatch__(dispatcher, callback, newCurFore, "foreground")
             return
 
         sleep(EVENT_RETRY_TIME)
@@ -75,7 +113,13 @@ def event_windowCreated(
     callback: Callable[[Window], None],
     windowSearchKwargs: dict,
     windowSearchArgs: list = [],
+    dispatcher=None,
 ):
+    """
+    dispatcher: a lib.WindowHandler.dispatch Dispatcher to run callback on,
+        events are keyed by hwnd
+    """
+
     haveWindow = State(None)
 
     def eventTick():
@@ -86,7 +130,7 @@ def event_windowCreated(
             )
         )
         if haveWindow.val != None:
-            callback(haveWindow.val)
+            __dispatch__(dispatcher, callback, haveWindow.val, haveWindow.val.hwnd)
             return
 
         sleep(EVENT_RETRY_TIME)
@@ -120,13 +164,82 @@ def searchForWindowByTitle(
     return __EnumWindows__(singleState, keyword, ignore, exact, breakOnFirst=True)
 
 
-def __EnumWindows__(
-    accumulator: State,
+class WindowSnapshot:
+    """
+    A single EnumWindows pass, kept around so a bunch of searches can share it
+
+    ex: snapshot = WindowSnapshot.take()
+        editor = snapshot.search("Notepad")
+        dialogs = snapshot.searchAll("Save As")
+    """
+
+    def __init__(self, windows: list[tuple[int, str]], takenAt: float = None) -> None:
+        self.windows = windows
+        self.takenAt = takenAt if takenAt != None else perf_counter()
+        self.hwnds = {hwnd for hwnd, _ in windows}
+
+    @classmethod
+    def take(cls) -> "WindowSnapshot":
+        windows = []
+        win32.EnumWindows(__titledWindows__, windows)
+        return cls(windows)
+
+    def __contains__(self, hwnd: int) -> bool:
+        return hwnd in self.hwnds
+
+    def __len__(self) -> int:
+        return len(self.windows)
+
+    def age(self) -> float:
+        return perf_counter() - self.takenAt
+
+    def matches(
+        self, keyword: str, ignore: list | str = None, exact: bool = False
+    ) -> list[tuple[int, str]]:
+        "Just the (hwnd, windowText) pairs, no Window objects get built"
+        isMatch = __makeTitleMatcher__(keyword, ignore, exact)
+        if isMatch == None:
+            return []
+
+        return [(hwnd, winText) for hwnd, winText in self.windows if isMatch(winText)]
+
+    def searchAll(
+        self, keyword: str, ignore: list | str = None, exact: bool = False
+    ) -> list[Window]:
+        return [
+            getWindowAsObject(hwnd, windowText=winText)
+            for hwnd, winText in self.matches(keyword, ignore, exact)
+        ]
+
+    def search(
+        self, keyword: str, ignore: list | str = None, exact: bool = False
+    ) -> Window | None:
+        isMatch = __makeTitleMatcher__(keyword, ignore, exact)
+        if isMatch == None:
+            return None
+
+        for hwnd, winText in self.windows:
+            if isMatch(winText):
+                return getWindowAsObject(hwnd, windowText=winText)
+
+        return None
+
+
+def __titledWindows__(hwnd: int, accumulator: list):
+    "An EnumWindows callback, collects (hwnd, windowText) pairs"
+    winText = win32.GetWindowText(hwnd)
+    # Same as __EnumWindows__, blank windows are never searchable
+    if winText == "":
+        return
+
+    accumulator.append((hwnd, winText))
+
+
+def __makeTitleMatcher__(
     keyword: str,
     ignore: list | str = None,
     exact: bool = False,
-    breakOnFirst: bool = False,
-) -> Window | list[Window]:
+) -> Callable[[str], bool] | None:
     if keyword == "":
         return None
 
@@ -147,21 +260,46 @@ def __EnumWindows__(
     fuzzyComp = lambda this, that: this in that  # I was proud to come up with this
     useComp: Callable = exactComp if exact else fuzzyComp  #
 
+    def isMatch(winText: str) -> bool:
+        return useComp(keyword, winText) and not any(
+            [True for ig in ignore if str(ig) in winText]
+        )
+
+    return isMatch
+
+
+def __EnumWindows__(
+    accumulator: State,
+    keyword: str,
+    ignore: list | str = None,
+    exact: bool = False,
+    breakOnFirst: bool = False,
+) -> Window | list[Window]:
+    isMatch = __makeTitleMatcher__(keyword, ignore, exact)
+    if isMatch == None:
+        return None
+
     def enumProc(hwnd: int, accumulator: State):
         # I like this too
         if breakOnFirst and accumulator.hasVal():
             return
 
-        winText = GetWindowText(hwnd)
+        winText = win32.GetWindowText(hwnd)
         # Skip all blank windows, gotta go fast
         if winText == "":
             return
 
-        if useComp(keyword, winText) and not any(
-            [True for ig in ignore if str(ig) in winText]
-        ):
+        if isMatch(winText):
             accumulator.setVal(getWindowAsObject(hwnd, windowText=winText))
             return
 
-    EnumWindows(enumProc, accumulator)
+    win32.EnumWindows(enumProc, accumulator)
     return accumulator.val  # Return the values we got from the State
+
+
+def __getattr__(name: str):
+    # This module used to star import the package, so older code grabs things
+    #   like Rect and pywinError from here, keep handing those out
+    from importlib import import_module
+
+    return getattr(import_module(__package__), name)
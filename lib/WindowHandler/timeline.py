@@ -0,0 +1,388 @@
+"""
+Who had the foreground and for how long
+
+ex: timeline = ForegroundTimeline()
+    loop = timeline.watch(timeoutSeconds=8 * 60 * 60)
+    ...
+    timeline.timeInApp(start=time() - 3600)   # {"C:\\...\\notepad.exe": 1234.5, ...}
+    timeline.foregroundAt(time() - 60)       # (hwnd, processID, exePath)
+    timeline.save("monday.fgt")
+
+    TimelineSegment.load("monday.fgt").timeInApp()
+
+Every transition is a row in a handful of numpy columns (timestamp, hwnd,
+    processID, exe id) kept as a ring buffer, exe paths are interned so a row
+    is 24 bytes whatever the path. Queries are array ops over the columns,
+    nothing builds a python object per transition unless you ask for records()
+
+A row means "this was the foreground from at until the next row", the last
+    one runs until now (or until the segment was saved)
+
+Timestamps are time.time(), they have to mean something in a file next week
+"""
+
+import json
+from time import time
+from struct import Struct
+from threading import Lock
+
+from . import Window
+from .managers import event_foregroundWindowChanged
+
+# fmt: off
+TIMELINE_CAPACITY = 65536
+TIMELINE_VERSION  = 1
+TIMELINE_MAGIC    = b"FGTIMELN"
+
+# name, dtype, every column lives in its own contiguous array
+TIMELINE_COLUMNS = (
+    ("at",        "<f8"),
+    ("hwnd",      "<i8"),
+    ("processID", "<u4"),
+    ("exe",       "<i4"),
+)
+# fmt: on
+
+# magic, then how many bytes of JSON header follow
+__prefix__ = Struct("<8sI")
+
+
+def __numpy__():
+    # Same as geometry, numpy only comes in once somebody keeps a timeline
+    import numpy
+
+    return numpy
+
+
+def __aligned__(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class TimelineSegment:
+    """
+    A read only, oldest first run of transitions, out of ForegroundTimeline.segment()
+        or off disk with TimelineSegment.load()
+
+    start / end arguments are timestamps, None means from the beginning / until the end
+
+    The first row is the foreground the segment starts with, cut out of a timeline
+        with a start it began before that, since is where it starts counting
+    """
+
+    def __init__(
+        self, columns: dict, exePaths: list[str], until: float, since: float = None
+    ) -> None:
+        "columns: {name: array} for every TIMELINE_COLUMNS name, all the same length"
+        self.at = columns["at"]
+        self.hwnd = columns["hwnd"]
+        self.processID = columns["processID"]
+        self.exe = columns["exe"]
+
+        self.exePaths = exePaths
+        # When the first row starts counting (None is when it began) and the last one stops
+        self.since = since
+        self.until = until
+
+    def __len__(self) -> int:
+        return len(self.at)
+
+    def __lower__(self, start: float = None) -> float | None:
+        "Nothing before since counts, whatever start asks for"
+        if self.since == None or (start != None and start > self.since):
+            return start
+
+        return self.since
+
+    def __durations__(self, start: float = None, end: float = None):
+        "Seconds each row spent in the foreground, clipped to [start, end)"
+        np = __numpy__()
+
+        ends = np.empty(len(self.at), dtype=np.float64)
+        ends[:-1] = self.at[1:]
+        ends[-1:] = self.until
+
+        start = self.__lower__(start)
+        lower = np.maximum(self.at, start if start != None else -np.inf)
+        upper = np.minimum(ends, end if end != None else np.inf)
+        return np.clip(upper - lower, 0, None)
+
+    def timeInApp(self, start: float = None, end: float = None) -> dict[str, float]:
+        "{exePath: seconds}, only apps that had some time"
+        np = __numpy__()
+        if len(self) == 0:
+            return dict()
+
+        seconds = np.bincount(
+            self.exe,
+            weights=self.__durations__(start, end),
+            minlength=len(self.exePaths),
+        )
+        return {
+            self.exePaths[index]: float(seconds[index])
+            for index in np.flatnonzero(seconds)
+        }
+
+    def timeBy(self, column: str, start: float = None, end: float = None) -> dict:
+        """
+        column: "hwnd" or "processID" ("exe" is timeInApp), {value: seconds}
+        """
+
+        np = __numpy__()
+        if column not in ("hwnd", "processID"):
+            raise ValueError(f"Unknown option 'column={column}'")
+
+        if len(self) == 0:
+            return dict()
+
+        keys, inverse = np.unique(getattr(self, column), return_inverse=True)
+        seconds = np.bincount(inverse, weights=self.__durations__(start, end))
+        return {
+            int(keys[index]): float(seconds[index]) for index in np.flatnonzero(seconds)
+        }
+
+    def switches(self, start: float = None, end: float = None) -> int:
+        "How many times the foreground changed in [start, end)"
+        np = __numpy__()
+
+        # The first row is where we started from, not a change
+        start = self.__lower__(start)
+        first = (
+            1
+            if start == None
+            else max(1, int(np.searchsorted(self.at, start, side="left")))
+        )
+        last = (
+            len(self)
+            if end == None
+            else int(np.searchsorted(self.at, end, side="left"))
+        )
+        return max(0, last - first)
+
+    def foregroundAt(self, timestamp: float) -> tuple[int, int, str] | None:
+        "(hwnd, processID, exePath) in the foreground at that moment"
+        np = __numpy__()
+
+        index = int(np.searchsorted(self.at, timestamp, side="right")) - 1
+        if index < 0 or timestamp >= self.until:
+            return None
+
+        if self.since != None and timestamp < self.since:
+            return None
+
+        return (
+            int(self.hwnd[index]),
+            int(self.processID[index]),
+            self.exePaths[self.exe[index]],
+        )
+
+    def records(self, start: float = None, end: float = None) -> list[tuple]:
+        "[(at, hwnd, processID, exePath), ...] for rows starting in [start, end), this one does build objects"
+        np = __numpy__()
+
+        first = (
+            0 if start == None else int(np.searchsorted(self.at, start, side="left"))
+        )
+        last = (
+            len(self)
+            if end == None
+            else int(np.searchsorted(self.at, end, side="left"))
+        )
+
+        return [
+            (float(at), int(hwnd), int(processID), self.exePaths[exe])
+            for at, hwnd, processID, exe in zip(
+                self.at[first:last].tolist(),
+                self.hwnd[first:last].tolist(),
+                self.processID[first:last].tolist(),
+                self.exe[first:last].tolist(),
+            )
+        ]
+
+    def save(self, path: str):
+        """
+        magic, header length, JSON header, then each column's raw bytes,
+            every piece starting on an 8 byte boundary so load() can map them
+        """
+
+        np = __numpy__()
+        header = {
+            "version": TIMELINE_VERSION,
+            "count": len(self),
+            "since": self.since,
+            "until": self.until,
+            "exePaths": self.exePaths,
+            "columns": [list(column) for column in TIMELINE_COLUMNS],
+        }
+        headerBytes = json.dumps(header).encode("utf-8")
+
+        with open(path, "wb") as file:
+            file.write(__prefix__.pack(TIMELINE_MAGIC, len(headerBytes)))
+            file.write(headerBytes)
+
+            for name, dtype in TIMELINE_COLUMNS:
+                file.write(b"\0" * (__aligned__(file.tell()) - file.tell()))
+                file.write(
+                    np.ascontiguousarray(getattr(self, name), dtype=dtype).tobytes()
+                )
+
+    @classmethod
+    def load(cls, path: str) -> "TimelineSegment":
+        "The columns are memory mapped, nothing is read until a query touches it"
+        np = __numpy__()
+
+        with open(path, "rb") as file:
+            magic, headerLength = __prefix__.unpack(file.read(__prefix__.size))
+            if magic != TIMELINE_MAGIC:
+                raise ValueError(f"{path} isn't a foreground timeline")
+
+            header = json.loads(file.read(headerLength).decode("utf-8"))
+            if header.get("version") != TIMELINE_VERSION:
+                raise ValueError(f"{path} isn't a version {TIMELINE_VERSION} timeline")
+
+        count = header["count"]
+        offset = __prefix__.size + headerLength
+        columns = dict()
+
+        for name, dtype in header["columns"]:
+            offset = __aligned__(offset)
+            if count == 0:
+                # There's nothing to map, mmap won't take an empty range
+                columns[name] = np.empty(0, dtype=dtype)
+            else:
+                columns[name] = np.memmap(
+                    path, dtype=dtype, mode="r", offset=offset, shape=(count,)
+                )
+
+            offset += count * np.dtype(dtype).itemsize
+
+        return cls(columns, header["exePaths"], header["until"], header.get("since"))
+
+
+class ForegroundTimeline:
+    def __init__(self, capacity: int = TIMELINE_CAPACITY) -> None:
+        "capacity: transitions kept, once it's full the oldest get overwritten"
+        np = __numpy__()
+
+        self.capacity = capacity
+        self.columns = {
+            name: np.zeros(capacity, dtype=dtype) for name, dtype in TIMELINE_COLUMNS
+        }
+        # Where the next row goes, and how many are in there
+        self.next = 0
+        self.count = 0
+        self.overwritten = 0
+
+        self.exePaths: list[str] = list()
+        self.exeIds: dict[str, int] = dict()
+        self.lastHwnd: int = None
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __internExe__(self, exePath: str) -> int:
+        exeID = self.exeIds.get(exePath)
+        if exeID == None:
+            exeID = self.exeIds[exePath] = len(self.exePaths)
+            self.exePaths.append(exePath)
+
+        return exeID
+
+    def record(self, hwnd: int, processID: int, exePath: str, at: float = None) -> bool:
+        "False if hwnd already has the foreground, that's not a transition"
+        at = at if at != None else time()
+        exePath = str(exePath or "")
+
+        with self.lock:
+            if hwnd == self.lastHwnd:
+                return False
+
+            row = self.next
+            columns = self.columns
+            columns["at"][row] = at
+            columns["hwnd"][row] = hwnd
+            columns["processID"][row] = processID
+            columns["exe"][row] = self.__internExe__(exePath)
+
+            self.lastHwnd = hwnd
+            self.next = (row + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+            else:
+                self.overwritten += 1
+
+        return True
+
+    def recordWindow(self, window: Window, at: float = None) -> bool:
+        return self.record(window.hwnd, window.processID, window.exePath, at)
+
+    def watch(self, timeoutSeconds: float = float("inf"), dispatcher=None):
+        """
+        Record whatever's in the foreground now, then every change after,
+            returns the EventLoop so you can stop() it
+        """
+
+        from . import getForegroundWindowAsObject
+
+        self.recordWindow(getForegroundWindowAsObject())
+        return event_foregroundWindowChanged(
+            self.recordWindow, timeout=timeoutSeconds, dispatcher=dispatcher
+        )
+
+    def segment(self, start: float = None, end: float = None) -> TimelineSegment:
+        """
+        Copies the rows out, oldest first, rows that stopped being foreground
+            before start or began at/after end are left behind
+        """
+
+        np = __numpy__()
+
+        with self.lock:
+            if self.count < self.capacity:
+                columns = {
+                    name: column[: self.count].copy()
+                    for name, column in self.columns.items()
+                }
+            else:
+                columns = {
+                    name: np.concatenate((column[self.next :], column[: self.next]))
+                    for name, column in self.columns.items()
+                }
+            exePaths = list(self.exePaths)
+
+        until = time() if end == None else min(time(), end)
+
+        if start != None or end != None:
+            at = columns["at"]
+            # The row before start is still the foreground at start, keep it
+            first = (
+                max(0, int(np.searchsorted(at, start, side="right")) - 1)
+                if start != None
+                else 0
+            )
+            last = (
+                int(np.searchsorted(at, end, side="left")) if end != None else len(at)
+            )
+            columns = {name: column[first:last] for name, column in columns.items()}
+
+        return TimelineSegment(columns, exePaths, until, since=start)
+
+    # The live timeline answers the same questions a segment does
+
+    def timeInApp(self, start: float = None, end: float = None) -> dict[str, float]:
+        return self.segment().timeInApp(start, end)
+
+    def timeBy(self, column: str, start: float = None, end: float = None) -> dict:
+        return self.segment().timeBy(column, start, end)
+
+    def switches(self, start: float = None, end: float = None) -> int:
+        return self.segment().switches(start, end)
+
+    def foregroundAt(self, timestamp: float) -> tuple[int, int, str] | None:
+        return self.segment().foregroundAt(timestamp)
+
+    def records(self, start: float = None, end: float = None) -> list[tuple]:
+        return self.segment().records(start, end)
+
+    def save(self, path: str, start: float = None, end: float = None):
+        self.segment(start, end).save(path)
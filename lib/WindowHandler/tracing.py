@@ -0,0 +1,318 @@
+"""
+Record every OS call lib.WindowHandler makes, then play it back anywhere
+
+ex: with recordTrace("slow-desktop.jsonl.gz"):
+        searchForWindowByTitle("Notepad")
+
+    # Later, on some Linux box
+    with replayTrace("slow-desktop.jsonl.gz", timing=True):
+        searchForWindowByTitle("Notepad")
+
+python -m lib.WindowHandler.tracing slow-desktop.jsonl.gz
+    prints where the time went, per function
+
+A trace is one JSON object per line, gzipped if the path ends in .gz:
+    {"header": {"version": 1, "backend": "win32", "constants": {...}}}
+    {"t": 0.0012, "fn": "GetWindowText", "args": [65552], "result": "Notepad", "dur": 0.00001}
+    {"t": 0.0031, "fn": "SetForegroundWindow", "args": [65552], "error": [5, "SetForegroundWindow", "Access is denied."], "dur": 0.0002}
+
+Enum* calls record the hwnds handed to the callback as their result
+"""
+
+import sys
+import gzip
+import json
+from time import perf_counter, sleep
+from threading import Lock
+from contextlib import contextmanager
+from collections import deque
+
+from . import useBackend, getBackend
+from .backends import WIN32_CONSTANTS, getPywinError
+
+TRACE_VERSION = 1
+
+
+class ReplayError(Exception):
+    def __init__(self, message: str, *args: object) -> None:
+        super().__init__(message, *args)
+
+
+def __openTrace__(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+def __jsonable__(value):
+    if value == None or type(value) in (int, float, str, bool):
+        return value
+
+    if type(value) in (tuple, list):
+        return [__jsonable__(item) for item in value]
+
+    # PyHANDLEs are ints as far as anybody downstream cares
+    if hasattr(value, "__int__"):
+        return int(value)
+
+    return repr(value)
+
+
+def __callbackIndex__(args: tuple) -> int | None:
+    for index, arg in enumerate(args):
+        if callable(arg):
+            return index
+
+    return None
+
+
+def __isTraced__(name: str, attribute) -> bool:
+    # Win32 functions are all PascalCase, constants are callable=False
+    return (
+        name[:1].isupper() and callable(attribute) and not isinstance(attribute, type)
+    )
+
+
+class RecordingBackend:
+    "Wraps another backend and writes every call it makes to a trace"
+
+    def __init__(self, inner, path: str) -> None:
+        self.inner = inner
+        self.name = f"recording:{inner.name}"
+        self.error = inner.error
+
+        self.path = path
+        self.file = __openTrace__(path, "w")
+        self.lock = Lock()
+        self.start = perf_counter()
+        self.calls = 0
+
+        constants = {name: getattr(inner, name) for name in WIN32_CONSTANTS}
+        header = {
+            "version": TRACE_VERSION,
+            "backend": inner.name,
+            "constants": constants,
+        }
+        self.file.write(json.dumps({"header": header}) + "\n")
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+    def __write__(self, entry: dict):
+        line = json.dumps(entry, separators=(",", ":"))
+        with self.lock:
+            if self.file.closed:
+                return
+
+            self.file.write(line + "\n")
+            self.calls += 1
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.inner, name)
+        if not __isTraced__(name, attribute):
+            return attribute
+
+        def traced(*args):
+            callbackAt = __callbackIndex__(args)
+            seen = None
+
+            if callbackAt != None:
+                seen = []
+                callback = args[callbackAt]
+
+                def recordingCallback(hwnd, *rest):
+                    seen.append(hwnd)
+                    return callback(hwnd, *rest)
+
+                args = (*args[:callbackAt], recordingCallback, *args[callbackAt + 1 :])
+                # The callback and whatever extra goes with it can't be written down
+                keyArgs = args[:callbackAt]
+            else:
+                keyArgs = args
+
+            entry = {
+                "t": perf_counter() - self.start,
+                "fn": name,
+                "args": __jsonable__(keyArgs),
+            }
+            callStart = perf_counter()
+            try:
+                result = attribute(*args)
+            except self.error as e:
+                entry["dur"] = perf_counter() - callStart
+                entry["error"] = [e.winerror, e.funcname, e.strerror]
+                self.__write__(entry)
+                raise
+
+            entry["dur"] = perf_counter() - callStart
+            entry["result"] = seen if seen != None else __jsonable__(result)
+            self.__write__(entry)
+            return result
+
+        traced.__name__ = name
+        # Next time skip __getattr__ altogether
+        self.__dict__[name] = traced
+        return traced
+
+
+class ReplayBackend:
+    """
+    Answers OS calls out of a trace
+
+    Calls are matched on (function, args) and each match hands back the next
+        recorded answer for it, so polling loops see the same sequence of
+        answers they saw live, whatever order threads make their calls in.
+        Once a key runs out it keeps repeating its last answer
+
+    timing: sleep for as long as the recorded call took, speed scales that
+    """
+
+    def __init__(self, path: str, timing: bool = False, speed: float = 1.0) -> None:
+        self.path = path
+        self.timing = timing
+        self.speed = speed
+        self.error = getPywinError()
+        self.lock = Lock()
+
+        self.answers: dict[tuple, deque] = dict()
+        self.last: dict[tuple, dict] = dict()
+        self.calls = 0
+        self.misses = 0
+
+        with __openTrace__(path, "r") as file:
+            header = json.loads(file.readline()).get("header")
+            if header == None or header.get("version") != TRACE_VERSION:
+                raise ReplayError(f"{path} isn't a version {TRACE_VERSION} trace")
+
+            for line in file:
+                entry = json.loads(line)
+                key = (entry["fn"], json.dumps(entry["args"]))
+                self.answers.setdefault(key, deque()).append(entry)
+
+        self.name = f"replay:{header['backend']}"
+        for constant, value in header["constants"].items():
+            setattr(self, constant, value)
+
+    def __answer__(self, name: str, keyArgs: tuple) -> dict:
+        key = (name, json.dumps(__jsonable__(keyArgs)))
+
+        with self.lock:
+            self.calls += 1
+            queue = self.answers.get(key)
+
+            if queue:
+                entry = queue.popleft()
+                self.last[key] = entry
+            elif key in self.last:
+                entry = self.last[key]
+            else:
+                self.misses += 1
+                raise ReplayError(f"Nothing recorded for {name}{tuple(keyArgs)}")
+
+        if self.timing and entry.get("dur"):
+            sleep(entry["dur"] / self.speed)
+
+        return entry
+
+    def __getattr__(self, name: str):
+        if not name[:1].isupper():
+            raise AttributeError(f"{type(self).__name__!r} has no attribute {name!r}")
+
+        def replayed(*args):
+            callbackAt = __callbackIndex__(args)
+            keyArgs = args[:callbackAt] if callbackAt != None else args
+            entry = self.__answer__(name, keyArgs)
+
+            if "error" in entry:
+                raise self.error(*entry["error"])
+
+            result = entry.get("result")
+            if callbackAt != None:
+                callback, rest = args[callbackAt], args[callbackAt + 1 :]
+                for hwnd in result:
+                    if callback(hwnd, *rest) == False:
+                        break
+
+                return None
+
+            # JSON turned every tuple into a list, GetWindowRect and friends hand out tuples
+            return tuple(result) if type(result) == list else result
+
+        replayed.__name__ = name
+        self.__dict__[name] = replayed
+        return replayed
+
+
+@contextmanager
+def recordTrace(path: str):
+    "Record everything done inside the with block, whatever backend is installed"
+    recorder = RecordingBackend(getBackend(), path)
+    previous = useBackend(recorder)
+    try:
+        yield recorder
+    finally:
+        useBackend(previous)
+        recorder.close()
+
+
+@contextmanager
+def replayTrace(path: str, **kwargs):
+    "kwargs are passed to ReplayBackend"
+    replay = ReplayBackend(path, **kwargs)
+    previous = useBackend(replay)
+    try:
+        yield replay
+    finally:
+        useBackend(previous)
+
+
+def summarizeTrace(path: str) -> dict[str, dict]:
+    """
+    {function: {"calls", "errors", "total", "mean", "max"}}, durations in seconds
+    """
+
+    summary = dict()
+    with __openTrace__(path, "r") as file:
+        file.readline()
+
+        for line in file:
+            entry = json.loads(line)
+            stats = summary.setdefault(
+                entry["fn"], {"calls": 0, "errors": 0, "total": 0.0, "max": 0.0}
+            )
+            stats["calls"] += 1
+            stats["errors"] += "error" in entry
+            stats["total"] += entry.get("dur", 0.0)
+            stats["max"] = max(stats["max"], entry.get("dur", 0.0))
+
+    for stats in summary.values():
+        stats["mean"] = stats["total"] / stats["calls"]
+
+    return summary
+
+
+def main(paths: list[str]) -> int:
+    if not paths:
+        print("python -m lib.WindowHandler.tracing TRACE [TRACE ...]")
+        return 2
+
+    for path in paths:
+        summary = summarizeTrace(path)
+        print(path)
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+            # fmt: off
+            print(
+                f"  {name:<28} {stats['calls']:>8} calls {stats['errors']:>6} errors"
+                f" {stats['total'] * 1000:>10.2f}ms total {stats['mean'] * 1e6:>9.1f}us mean"
+                f" {stats['max'] * 1000:>9.2f}ms max"
+            )
+            # fmt: on
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
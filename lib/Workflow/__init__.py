@@ -0,0 +1,381 @@
+from time import sleep, perf_counter
+from threading import Lock
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from lib.WindowHandler import Window, WIN32_MESSAGE
+from lib.WindowHandler.managers import WindowSnapshot
+from lib.Macro import Macro
+
+STEP_PENDING = "pending"
+STEP_DONE = "done"
+STEP_FAILED = "failed"
+STEP_TIMEOUT = "timeout"
+STEP_SKIPPED = "skipped"
+
+# How long the scheduler naps when a whole tick went by without a step finishing
+WORKFLOW_IDLE_TICK = 0.05
+
+
+class StepFailed(Exception):
+    def __init__(self, message: str, *args: object) -> None:
+        super().__init__(message, *args)
+
+
+class StepContext:
+    """
+    What a step gets handed every time it's polled
+
+    snapshot is shared by every step in the same tick, so ten steps waiting
+        on ten windows only cost one EnumWindows
+    """
+
+    def __init__(self, windows: dict, foregroundLock: Lock) -> None:
+        self.windows = windows
+        self.foregroundLock = foregroundLock
+        self.snapshot: WindowSnapshot = None
+
+    def window(self, stepName: str) -> Window:
+        if stepName not in self.windows:
+            raise StepFailed(f"No window found by step '{stepName}'")
+
+        return self.windows[stepName]
+
+
+@dataclass
+class Step:
+    name: str
+    after: list[str] = field(default_factory=list, kw_only=True)
+    timeoutSeconds: float = field(default=10, kw_only=True)
+
+    # Steps that need a fresh look at the desktop every tick
+    usesSnapshot = False
+    # Steps that fight over the foreground get run one at a time
+    needsForeground = False
+
+    def dependencies(self) -> list[str]:
+        return list(self.after)
+
+    def poll(self, context: StepContext) -> bool:
+        "Return True when done, False to get polled again next tick"
+        raise NotImplementedError("No Implementation")
+
+
+@dataclass
+class WindowStep(Step):
+    # The name of the WaitForWindow step that found our window
+    window: str = None
+
+    def dependencies(self) -> list[str]:
+        deps = super().dependencies()
+        if self.window != None and self.window not in deps:
+            deps.append(self.window)
+
+        return deps
+
+    def target(self, context: StepContext) -> Window:
+        return context.window(self.window)
+
+
+@dataclass
+class WaitForWindow(Step):
+    keyword: str = None
+    ignore: list | str = None
+    exact: bool = False
+
+    usesSnapshot = True
+
+    def poll(self, context: StepContext) -> bool:
+        found = context.snapshot.search(self.keyword, self.ignore, self.exact)
+        if found == None:
+            return False
+
+        context.windows[self.name] = found
+        return True
+
+
+@dataclass
+class WaitForClose(WindowStep):
+    usesSnapshot = True
+
+    def poll(self, context: StepContext) -> bool:
+        return self.target(context).hwnd not in context.snapshot
+
+
+@dataclass
+class Activate(WindowStep):
+    withMinimize: bool = False
+
+    needsForeground = True
+
+    def poll(self, context: StepContext) -> bool:
+        window = self.target(context)
+        if window.isForeground():
+            return True
+
+        return window.tryActivate(withMinimize=self.withMinimize)
+
+
+@dataclass
+class SendMessage(WindowStep):
+    message: WIN32_MESSAGE = None
+    wParam: Any = None
+    lParam: Any = None
+    tryWaitForMessageToProcess: bool = True
+
+    def poll(self, context: StepContext) -> bool:
+        isError = self.target(context).sendWindowMessage(
+            self.message,
+            self.wParam,
+            self.lParam,
+            tryWaitForMessageToProcess=self.tryWaitForMessageToProcess,
+        )
+        if isError:
+            raise StepFailed(f"Sending message {self.message} failed")
+
+        return True
+
+
+@dataclass
+class SendKeys(WindowStep):
+    """
+    keys: a Macro sequence like "hello{enter}", or a hotkey like "ctrl+s" when hotkey=True
+    sink: passed to the Macro, FakeSink for testing
+    """
+
+    keys: str = ""
+    hotkey: bool = False
+    keyInterval: float = 0.0
+    sink: Any = None
+
+    needsForeground = True
+
+    def __post_init__(self):
+        # Compile once up front, a typo in the sequence should fail the declaration not the run
+        sequence = "{" + self.keys + "}" if self.hotkey else self.keys
+        self.macro = Macro(sequence, self.sink, self.keyInterval)
+
+    def poll(self, context: StepContext) -> bool:
+        played = self.macro.play(self.target(context))
+
+        if not played.aborted:
+            return True
+
+        # Nothing went out yet, so we can try again next tick without double typing
+        if played.batchesPlayed == 0:
+            return False
+
+        raise StepFailed(
+            f"Lost focus after {played.keysSent}/{self.macro.keyCount} keys"
+        )
+
+
+@dataclass
+class StepResult:
+    name: str
+    status: str = STEP_PENDING
+    startedAt: float = None
+    finishedAt: float = None
+    polls: int = 0
+    pollSeconds: float = 0.0
+    error: Exception = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.startedAt == None or self.finishedAt == None:
+            return 0.0
+
+        return self.finishedAt - self.startedAt
+
+
+@dataclass
+class WorkflowResult:
+    name: str
+    steps: dict[str, StepResult]
+    elapsed: float = 0.0
+    ticks: int = 0
+    snapshots: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return all(step.status == STEP_DONE for step in self.steps.values())
+
+    def report(self) -> str:
+        lines = [
+            f"{self.name}: {'ok' if self.ok else 'FAILED'} in {self.elapsed:.3f}s"
+            f" ({self.ticks} ticks, {self.snapshots} snapshots)"
+        ]
+        for step in self.steps.values():
+            # fmt: off
+            lines.append(
+                f"  {step.name:<24} {step.status:<8}"
+                f" {step.elapsed:>8.3f}s  {step.polls:>4} polls  {step.pollSeconds:>8.3f}s busy"
+                + (f"  {step.error}" if step.error != None else "")
+            )
+            # fmt: on
+
+        return "\n".join(lines)
+
+
+class Workflow:
+    """
+    A job declared as a list of steps, steps start once everything in their
+        dependencies() is done
+
+    ex: Workflow("save notes", [
+            WaitForWindow("editor", keyword="Notepad"),
+            Activate("focus", window="editor"),
+            SendKeys("save", window="editor", keys="ctrl+s", hotkey=True, after=["focus"]),
+        ]).run()
+    """
+
+    def __init__(self, name: str, steps: list[Step]) -> None:
+        self.name = name
+        self.steps = {}
+
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"Duplicate step name '{step.name}'")
+
+            self.steps[step.name] = step
+
+        for step in steps:
+            for dep in step.dependencies():
+                if dep not in self.steps:
+                    raise ValueError(f"Step '{step.name}' depends on unknown '{dep}'")
+
+        self.__checkForCycles__()
+
+    def __checkForCycles__(self):
+        visiting, visited = set(), set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Step '{name}' depends on itself")
+
+            visiting.add(name)
+            for dep in self.steps[name].dependencies():
+                visit(dep)
+
+            visiting.remove(name)
+            visited.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    def run(self, **kwargs) -> WorkflowResult:
+        "kwargs are passed to Scheduler"
+        return Scheduler(self, **kwargs).run()
+
+
+class Scheduler:
+    """
+    Runs a Workflow in ticks:
+        - every step whose dependencies are done gets polled, concurrently
+        - one WindowSnapshot is taken per tick, only if a polled step wants one
+        - if any step finished we go straight into the next tick, otherwise nap
+    """
+
+    def __init__(
+        self,
+        workflow: Workflow,
+        maxWorkers: int = 4,
+        idleTick: float = WORKFLOW_IDLE_TICK,
+    ) -> None:
+        self.workflow = workflow
+        self.maxWorkers = maxWorkers
+        self.idleTick = idleTick
+
+        self.context = StepContext(dict(), Lock())
+        self.results = {name: StepResult(name) for name in workflow.steps}
+
+    def __ready__(self) -> list[Step]:
+        ready = []
+        for name, step in self.workflow.steps.items():
+            if self.results[name].status != STEP_PENDING:
+                continue
+
+            depStatus = [self.results[dep].status for dep in step.dependencies()]
+            if any(status not in (STEP_PENDING, STEP_DONE) for status in depStatus):
+                self.__finish__(self.results[name], STEP_SKIPPED)
+                continue
+
+            if all(status == STEP_DONE for status in depStatus):
+                ready.append(step)
+
+        return ready
+
+    def __finish__(self, result: StepResult, status: str, error: Exception = None):
+        result.status = status
+        result.error = error
+        result.finishedAt = perf_counter()
+        if result.startedAt == None:
+            result.startedAt = result.finishedAt
+
+    def __pollStep__(self, step: Step) -> bool:
+        result = self.results[step.name]
+        if result.startedAt == None:
+            result.startedAt = perf_counter()
+
+        pollStart = perf_counter()
+        try:
+            if step.needsForeground:
+                with self.context.foregroundLock:
+                    isDone = step.poll(self.context)
+            else:
+                isDone = step.poll(self.context)
+
+        except Exception as e:
+            self.__finish__(result, STEP_FAILED, e)
+            return True
+
+        finally:
+            result.polls += 1
+            result.pollSeconds += perf_counter() - pollStart
+
+        if isDone:
+            self.__finish__(result, STEP_DONE)
+            return True
+
+        if perf_counter() - result.startedAt >= step.timeoutSeconds:
+            self.__finish__(result, STEP_TIMEOUT)
+            return True
+
+        return False
+
+    def run(self) -> WorkflowResult:
+        ret = WorkflowResult(self.workflow.name, self.results)
+        start = perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.maxWorkers) as pool:
+            while True:
+                ready = self.__ready__()
+                if not ready:
+                    # Nothing left that can run, everything is done, failed or skipped
+                    break
+
+                ret.ticks += 1
+                self.context.snapshot = None
+                if any(step.usesSnapshot for step in ready):
+                    self.context.snapshot = WindowSnapshot.take()
+                    ret.snapshots += 1
+
+                if len(ready) == 1:
+                    # Don't pay for a thread hop when there's nothing to overlap
+                    progressed = [self.__pollStep__(ready[0])]
+                else:
+                    progressed = list(pool.map(self.__pollStep__, ready))
+
+                if not any(progressed):
+                    sleep(self.idleTick)
+
+        # Anything still pending was waiting on something that never finished
+        for result in self.results.values():
+            if result.status == STEP_PENDING:
+                self.__finish__(result, STEP_SKIPPED)
+
+        ret.elapsed = perf_counter() - start
+        return ret
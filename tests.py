@@ -1,24 +1,73 @@
 import os
+import sys
 import time
+import socket
+import asyncio
+import tempfile
+import subprocess
 import unittest
 import tkinter as tk
 
-from win32con import WM_SETTEXT
-
 from threading import Thread, Event
+from multiprocessing import AuthenticationError
 
 from uuid import uuid1
-from lib.WindowHandler import Window
+from lib.WindowHandler import Window, useBackend
+from lib.WindowHandler.backends import SimulatedBackend
+from lib.WindowHandler.geometry import GeometryTable
+from lib.WindowHandler.desktops import DesktopSnapshot
+from lib.WindowHandler.timeline import ForegroundTimeline, TimelineSegment
+from lib.WindowHandler.dispatch import (
+    InlineDispatcher,
+    ThreadPoolDispatcher,
+    AsyncioDispatcher,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_DROP_NEWEST,
+)
+from lib.WindowHandler.handles import ProcessHandlePool, handlePool
+from lib.WindowHandler.errors import ErrorChannel, getErrorChannel, setErrorSink
+from lib.WindowHandler.tracing import (
+    recordTrace,
+    replayTrace,
+    summarizeTrace,
+    ReplayError,
+)
+from lib.Macro import Macro, FakeSink, EVENT_PRESS, EVENT_RELEASE, EVENT_TEXT
+from lib.Controller import (
+    ControllerServer,
+    ControllerError,
+    getAuthkey,
+    CONTROLLER_ADDRESS,
+    EVENT_CREATED,
+    EVENT_DESTROYED,
+)
+from lib.Controller.client import ControllerClient
+from lib.Workflow import (
+    Workflow,
+    WaitForWindow,
+    WaitForClose,
+    SendMessage,
+    Activate,
+    SendKeys,
+    STEP_DONE,
+    STEP_SKIPPED,
+    STEP_TIMEOUT,
+)
 from lib.WindowHandler.managers import (
     event_windowCreated,
+    event_foregroundWindowChanged,
     searchForWindowByTitle,
     getForegroundWindowAsObject,
     doesWindowExistIsItForeground,
     Rect,
     State,
     pywinError,
+    WindowSnapshot,
 )
 
+# The same values win32con has, the simulated tests shouldn't need pywin32 to run
+WM_SETTEXT, WM_CLOSE = SimulatedBackend.WM_SETTEXT, SimulatedBackend.WM_CLOSE
+
 # fmt: off
 doAll = True
 run_T_WindowHandlers = doAll if doAll else False
@@ -26,6 +75,18 @@ run_T_WindowMessage  = doAll if doAll else False
 run_T_WindowManager  = doAll if doAll else False
 run_T_WindowPosition = doAll if doAll else False
 run_T_EventsTest     = doAll if doAll else False
+run_T_WorkflowTest   = doAll if doAll else False
+run_T_MacroTest      = doAll if doAll else False
+run_T_ControllerTest = doAll if doAll else False
+run_T_ImportTest     = doAll if doAll else False
+run_T_GeometryTest   = doAll if doAll else False
+run_T_TraceTest      = doAll if doAll else False
+run_T_ErrorTest      = doAll if doAll else False
+run_T_DispatchTest   = doAll if doAll else False
+run_T_HandlePoolTest = doAll if doAll else False
+run_T_ControlTest    = doAll if doAll else False
+run_T_DesktopTest    = doAll if doAll else False
+run_T_TimelineTest   = doAll if doAll else False
 # fmt: on
 
 actionWaitTime = 0.2
@@ -50,6 +111,20 @@ def createAndGetWindowRef(title: str, message: str = None):
     return searchForWindowByTitle(title)
 
 
+def useSimulatedDesktop(test: unittest.TestCase) -> SimulatedBackend:
+    "A fresh in memory desktop for the rest of the test, whatever was installed comes back after"
+    desktop = SimulatedBackend()
+    test.addCleanup(useBackend, useBackend(desktop))
+    return desktop
+
+
+class SimulatedDesktopTest(unittest.TestCase):
+    "self.desktop is a fresh SimulatedBackend, installed for every test"
+
+    def setUp(self):
+        self.desktop = useSimulatedDesktop(self)
+
+
 @unittest.skipIf(not run_T_WindowHandlers, "Not Testing")
 class T_WindowHandlers(unittest.TestCase):
 
@@ -358,5 +433,995 @@ class T_WindowPositionTests(unittest.TestCase):
         self.assertIsNone(searchForWindowByTitle(windowTitle))
 
 
+@unittest.skipIf(not run_T_WorkflowTest, "Skipped")
+class T_WorkflowTest(unittest.TestCase):
+
+    def test_workflowRunsSteps(self):
+        windowName = f"Window: {uuid1()}"
+        newName = f"Renamed: {uuid1()}"
+        createAndGetWindowRef(windowName, "Workflow!")
+
+        result = Workflow(
+            "rename and close",
+            [
+                WaitForWindow("window", keyword=windowName),
+                SendMessage(
+                    "rename", window="window", message=WM_SETTEXT, lParam=newName
+                ),
+                WaitForWindow("renamed", keyword=newName, after=["rename"]),
+                SendMessage(
+                    "close",
+                    window="renamed",
+                    message=WM_CLOSE,
+                    tryWaitForMessageToProcess=False,
+                ),
+                WaitForClose("closed", window="renamed", after=["close"]),
+            ],
+        ).run()
+
+        self.assertTrue(result.ok, result.report())
+        self.assertLessEqual(result.snapshots, result.ticks)
+        self.assertIsNone(searchForWindowByTitle(newName))
+
+    def test_workflowSkipsAfterTimeout(self):
+        result = Workflow(
+            "never",
+            [
+                WaitForWindow("missing", keyword="__EMPTY__", timeoutSeconds=0.5),
+                WaitForClose("closed", window="missing"),
+            ],
+        ).run()
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.steps["missing"].status, STEP_TIMEOUT)
+        self.assertEqual(result.steps["closed"].status, STEP_SKIPPED)
+
+    def test_sharedSnapshot(self):
+        names = [f"Window: {uuid1()}" for _ in range(3)]
+        windows = [createAndGetWindowRef(name) for name in names]
+
+        result = Workflow(
+            "all at once", [WaitForWindow(name, keyword=name) for name in names]
+        ).run()
+
+        self.assertTrue(all(step.status == STEP_DONE for step in result.steps.values()))
+        # All three were already up, so they should all be found off one EnumWindows
+        self.assertEqual(result.snapshots, 1)
+
+        for window in windows:
+            window.tryDestroy()
+        time.sleep(windowCreateDestroyTime)
+
+    def test_foregroundStepsTakeTurns(self):
+        desktop = useSimulatedDesktop(self)
+
+        left = desktop.createWindow("Left")
+        right = desktop.createWindow("Right")
+
+        class ForegroundSink(FakeSink):
+            "Notes who had the foreground for every piece of text"
+
+            def text(self, text: str):
+                typedInto.append((desktop.GetForegroundWindow(), text))
+                super().text(text)
+
+        typedInto = []
+        sink = ForegroundSink()
+
+        steps = []
+        for name in ["Left", "Right"]:
+            # The wait leaves room for the other side to barge in, if it could
+            steps += [
+                WaitForWindow(f"find{name}", keyword=name, exact=True),
+                Activate(f"focus{name}", window=f"find{name}"),
+                SendKeys(
+                    f"type{name}",
+                    window=f"find{name}",
+                    keys=f"{name.lower()}{{wait 0.05}}{name}",
+                    sink=sink,
+                    after=[f"focus{name}"],
+                ),
+            ]
+
+        result = Workflow("two windows", steps).run()
+
+        self.assertTrue(result.ok, result.report())
+        self.assertIn(
+            sink.typed(), ["leftLeftrightRight", "rightRightleftLeft"], typedInto
+        )
+        for hwnd, text in typedInto:
+            self.assertEqual(hwnd, left if text.lower() == "left" else right)
+
+    def test_oneSnapshotPerTick(self):
+        desktop = useSimulatedDesktop(self)
+
+        for i in range(40):
+            desktop.createWindow(f"Job {i}")
+
+        result = Workflow(
+            "forty at once",
+            [
+                WaitForWindow(f"job{i}", keyword=f"Job {i}", exact=True)
+                for i in range(40)
+            ],
+        ).run()
+
+        self.assertTrue(result.ok, result.report())
+        self.assertEqual(result.ticks, 1)
+        self.assertEqual(result.snapshots, 1)
+
+
+@unittest.skipIf(not run_T_MacroTest, "Skipped")
+class T_MacroTest(unittest.TestCase):
+
+    def test_macroCompilesAndPlays(self):
+        sink = FakeSink()
+        macro = Macro("hello{{}}{ctrl+s}{wait 0.1}bye", sink)
+
+        self.assertEqual(len(macro.batches), 2)
+        self.assertEqual(macro.keyCount, len("hello{}") + 2 + len("bye"))
+
+        result = macro.play()
+
+        self.assertFalse(result.aborted)
+        self.assertEqual(result.keysSent, macro.keyCount)
+        self.assertGreaterEqual(result.waitSeconds, 0.1)
+        self.assertEqual(sink.typed(), "hello{}bye")
+
+        chord = [(kind, code) for _, kind, code in sink.events if kind != EVENT_TEXT]
+        # fmt: off
+        self.assertEqual(chord, [
+            (EVENT_PRESS, "ctrl"), (EVENT_PRESS, "s"),
+            (EVENT_RELEASE, "s"), (EVENT_RELEASE, "ctrl"),
+        ])
+        # fmt: on
+
+    def test_macroKeyInterval(self):
+        sink = FakeSink()
+        result = Macro("abcdef", sink, keyInterval=0.01).play()
+
+        stamps = [stamp for stamp, _, _ in sink.events]
+        gaps = [after - before for before, after in zip(stamps, stamps[1:])]
+
+        self.assertEqual(len(sink.events), 6)
+        self.assertTrue(all(gap >= 0.0099 for gap in gaps), gaps)
+        self.assertGreater(result.keysPerSecond, 0)
+
+    def test_macroAbortsOnFocusLoss(self):
+        windowName = f"Window: {uuid1()}"
+        window = createAndGetWindowRef(windowName)
+        window.tryActivate()
+        time.sleep(actionWaitTime)
+
+        sink = FakeSink()
+        macro = Macro("first{wait 0.1}second", sink)
+        self.assertFalse(macro.play(window).aborted)
+
+        window.tryDestroy()
+        time.sleep(windowCreateDestroyTime)
+
+        result = macro.play(window)
+        self.assertTrue(result.aborted)
+        self.assertEqual(result.abortedAtBatch, 0)
+        self.assertEqual(sink.typed(), "firstsecond")
+
+
+@unittest.skipIf(not run_T_ControllerTest, "Skipped")
+class T_ControllerTest(SimulatedDesktopTest):
+
+    def setUp(self):
+        super().setUp()
+        self.hwnds = [self.desktop.createWindow(f"Simulated {i}") for i in range(50)]
+
+        tempDir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempDir.cleanup)
+        self.tempDir = tempDir.name
+
+        if sys.platform == "win32":
+            self.address = f"{CONTROLLER_ADDRESS}Test-{uuid1()}"
+        else:
+            self.address = os.path.join(self.tempDir, "controller.sock")
+
+        # Not the real per user key, tests shouldn't touch the home directory
+        self.authkey = getAuthkey(os.path.join(self.tempDir, "controller.key"))
+
+        self.server = ControllerServer(
+            self.address, authkey=self.authkey, refreshSeconds=0.05
+        )
+        self.server.start()
+        self.client = ControllerClient(self.address, authkey=self.authkey)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_controllerSearchesWarmSnapshot(self):
+        window = self.client.search("Simulated 7", exact=True)
+
+        self.assertIsNotNone(window)
+        self.assertEqual(window.windowTitle, "Simulated 7")
+
+        self.client.search("Simulated 7", exact=True)
+        self.assertGreaterEqual(self.client.stats()["cacheHits"], 1)
+        self.assertEqual(len(self.client.searchAll("Simulated")), 50)
+
+    def test_controllerActivateAndMessage(self):
+        window = self.client.search("Simulated 3", exact=True)
+
+        self.assertTrue(self.client.activate(window))
+        self.assertEqual(self.client.foreground().hwnd, window.hwnd)
+
+        self.assertFalse(self.client.sendWindowMessage(window, WM_CLOSE))
+        self.assertIsNone(self.client.search("Simulated 3", exact=True, maxAge=0))
+
+    def test_controllerSubscribe(self):
+        created = State(None)
+        event = Event()
+
+        def listen():
+            for window in self.client.subscribe(EVENT_CREATED, "Late"):
+                created.setVal(window)
+                event.set()
+                return
+
+        Thread(target=listen, daemon=True).start()
+        time.sleep(actionWaitTime)
+        self.desktop.createWindow("Late Window")
+
+        self.assertTrue(event.wait(2))
+        self.assertEqual(created.val.windowTitle, "Late Window")
+
+    def test_controllerDestroyedDoesntAskTheOS(self):
+        destroyed = []
+        event = Event()
+
+        def listen():
+            for window in self.client.subscribe(EVENT_DESTROYED, "Simulated"):
+                destroyed.append(window)
+                if len(destroyed) == 2:
+                    event.set()
+                    return
+
+        cached = self.client.search("Simulated 4", exact=True)
+        uncached = self.hwnds[5]
+
+        Thread(target=listen, daemon=True).start()
+        time.sleep(actionWaitTime)
+
+        getErrorChannel().clear()
+        self.desktop.destroyWindow(cached.hwnd)
+        self.desktop.destroyWindow(uncached)
+
+        self.assertTrue(event.wait(2))
+        counters = getErrorChannel().stats()["counters"]
+        self.assertNotIn("OpenProcess", counters)
+        self.assertNotIn("GetWindowRect", counters)
+
+        byHwnd = {window.hwnd: window for window in destroyed}
+        # The one the server had cached comes back whole, the other one as what we knew
+        self.assertEqual(byHwnd[cached.hwnd].processID, cached.processID)
+        self.assertEqual(byHwnd[cached.hwnd].exePath, cached.exePath)
+        self.assertEqual(byHwnd[uncached].windowTitle, "Simulated 5")
+        self.assertEqual(byHwnd[uncached].processID, 0)
+
+    def test_controllerAuthkeyFile(self):
+        path = os.path.join(self.tempDir, "controller.key")
+
+        self.assertEqual(getAuthkey(path), self.authkey)
+        self.assertEqual(len(self.authkey), 32)
+        if sys.platform != "win32":
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+        # Neither end talks to somebody without the key
+        with self.assertRaises(AuthenticationError):
+            ControllerClient(self.address, authkey=b"not the key")
+
+    def test_controllerDoesntTakeOverALiveAddress(self):
+        with self.assertRaises(ControllerError):
+            ControllerServer(self.address, authkey=b"not the key").start()
+
+        self.assertEqual(self.client.ping(), "pong")
+
+    @unittest.skipIf(sys.platform == "win32", "Pipes don't leave anything behind")
+    def test_controllerRemovesStaleSocket(self):
+        path = os.path.join(self.tempDir, "stale.sock")
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(path)
+        stale.close()
+
+        server = ControllerServer(path, authkey=self.authkey)
+        server.start()
+        try:
+            with ControllerClient(path, authkey=self.authkey) as client:
+                self.assertEqual(client.ping(), "pong")
+        finally:
+            server.stop()
+
+    def test_controllerRefreshNeverGoesBackwards(self):
+        # Not started, so there's no watcher racing us
+        server = ControllerServer(self.address + "-unused", authkey=self.authkey)
+        server.refresh()
+
+        enumWindows = self.desktop.EnumWindows
+        slow = Event()
+        slow.set()
+
+        def slowEnumWindows(callback, extra):
+            enumWindows(callback, extra)
+            if slow.is_set():
+                slow.clear()
+                # Taken, not installed yet
+                time.sleep(0.2)
+
+        self.desktop.EnumWindows = slowEnumWindows
+        stale = Thread(target=server.refresh)
+        stale.start()
+        time.sleep(0.05)
+
+        hwnd = self.desktop.createWindow("Refreshed")
+        server.refresh()
+        stale.join()
+
+        self.assertIn(hwnd, server.snapshot)
+
+
+@unittest.skipIf(not run_T_ImportTest, "Skipped")
+class T_ImportTest(unittest.TestCase):
+
+    def test_importIsLazy(self):
+        # Looking something up pulls in managers, that shouldn't bring the rest along
+        for access in ["pass", "lib.WindowHandler.searchForWindowByTitle"]:
+            code = "; ".join(
+                [
+                    "import sys, lib.WindowHandler",
+                    access,
+                    "print(','.join(m for m in sys.modules if m.startswith(('win32', 'pywintypes', 'dataclasses', 'typing'))))",
+                ]
+            )
+            loaded = subprocess.run(
+                [sys.executable, "-c", code], capture_output=True, text=True, check=True
+            ).stdout.strip()
+
+            self.assertEqual(loaded, "", access)
+
+    def test_lazyAttributesResolve(self):
+        import lib.WindowHandler as windowHandler
+
+        for name in windowHandler.__all__:
+            self.assertIsNotNone(getattr(windowHandler, name), name)
+
+        self.assertIs(windowHandler.searchForWindowByTitle, searchForWindowByTitle)
+        self.assertIs(windowHandler.pywinError, pywinError)
+
+
+@unittest.skipIf(not run_T_GeometryTest, "Skipped")
+class T_GeometryTest(SimulatedDesktopTest):
+
+    def setUp(self):
+        super().setUp()
+
+        # Created bottom to top, each new window goes on top of the z-order
+        # fmt: off
+        self.bottom = self.desktop.createWindow("Bottom", rect=(0, 0, 500, 500))
+        self.middle = self.desktop.createWindow("Middle", rect=(100, 100, 200, 200))
+        self.hidden = self.desktop.createWindow("Hidden", rect=(0, 0, 1000, 1000), visible=False)
+        self.top    = self.desktop.createWindow("Top",    rect=(150, 150, 300, 300))
+        # fmt: on
+
+        self.table = GeometryTable.fromSnapshot()
+
+    def test_windowAt(self):
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(self.table.windowAt(160, 160), self.top)
+        self.assertEqual(self.table.windowAt(110, 110), self.middle)
+        self.assertEqual(self.table.windowAt(10, 10), self.bottom)
+        self.assertIsNone(self.table.windowAt(900, 900))
+
+        # right and bottom edges are exclusive
+        self.assertEqual(self.table.windowAt(299, 299), self.top)
+        self.assertEqual(self.table.windowAt(300, 300), self.bottom)
+
+        found = self.table.windowsAt([(160, 160), (10, 10), (900, 900)])
+        self.assertEqual(list(found), [self.top, self.bottom, 0])
+
+    def test_overlapAndOcclusion(self):
+        self.assertEqual(
+            self.table.overlapping(Rect(0, 0, 120, 120)), [self.middle, self.bottom]
+        )
+        self.assertEqual(self.table.occludedBy(self.middle), [self.top])
+
+        self.assertTrue(self.table.isOccluded(self.bottom))
+        self.assertFalse(self.table.isOccluded(self.bottom, fully=True))
+        self.assertFalse(self.table.isOccluded(self.top))
+
+    def test_untitledWindowsCount(self):
+        # Untitled windows never make it into a WindowSnapshot, they still cover things
+        untitled = self.desktop.createWindow("", rect=(0, 0, 50, 50))
+        table = GeometryTable.fromSnapshot()
+
+        self.assertIn(untitled, table)
+        self.assertEqual(table.windowAt(10, 10), untitled)
+        self.assertTrue(table.isOccluded(self.bottom))
+        self.assertNotIn(untitled, GeometryTable.fromSnapshot(WindowSnapshot.take()))
+
+    def test_rectToPoint(self):
+        rect = self.table.rectOf(self.middle)
+
+        self.assertEqual(rect, Rect(100, 100, 200, 200))
+        self.assertEqual(self.table.windowAtPoint(rect.toPoint()), self.top)
+
+
+@unittest.skipIf(not run_T_TraceTest, "Skipped")
+class T_TraceTest(SimulatedDesktopTest):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(10):
+            self.desktop.createWindow(f"Traced {i}")
+
+        self.traceDir = tempfile.TemporaryDirectory()
+        self.tracePath = os.path.join(self.traceDir.name, "trace.jsonl.gz")
+
+    def tearDown(self):
+        self.traceDir.cleanup()
+
+    def workload(self):
+        window = searchForWindowByTitle("Traced 4")
+        activated = window.tryActivate()
+        foreground = getForegroundWindowAsObject().windowTitle
+        window.tryDestroy()
+
+        return (window.hwnd, activated, foreground, searchForWindowByTitle("Traced 4"))
+
+    def test_replayMatchesRecording(self):
+        with recordTrace(self.tracePath) as recorder:
+            recorded = self.workload()
+
+        self.assertGreater(recorder.calls, 0)
+
+        # Nothing live to fall back on, everything has to come out of the trace
+        useBackend(None)
+        with replayTrace(self.tracePath) as replay:
+            replayed = self.workload()
+
+        self.assertEqual(recorded, replayed)
+        self.assertEqual(replay.misses, 0)
+
+    def test_replayMissesAreLoud(self):
+        with recordTrace(self.tracePath):
+            self.workload()
+
+        with replayTrace(self.tracePath) as replay:
+            with self.assertRaises(ReplayError):
+                replay.GetWindowRect(-1)
+
+    def test_summarizeTrace(self):
+        with recordTrace(self.tracePath):
+            self.workload()
+
+        summary = summarizeTrace(self.tracePath)
+        self.assertEqual(summary["EnumWindows"]["calls"], 2)
+        self.assertGreater(summary["GetWindowText"]["calls"], 0)
+
+
+@unittest.skipIf(not run_T_ErrorTest, "Skipped")
+class T_ErrorTest(SimulatedDesktopTest):
+
+    def setUp(self):
+        super().setUp()
+
+        self.emitted = []
+        self.previousSink = setErrorSink(self.emitted.append)
+        getErrorChannel().clear()
+
+    def tearDown(self):
+        setErrorSink(self.previousSink)
+
+    def test_errorsAreCountedNotPrinted(self):
+        hwnd = self.desktop.createWindow("Going Away")
+        window = searchForWindowByTitle("Going Away")
+        self.desktop.destroyWindow(hwnd)
+
+        for _ in range(20):
+            self.assertTrue(window.sendWindowMessage(WM_CLOSE))
+
+        stats = getErrorChannel().stats()
+        self.assertEqual(stats["counters"]["SendMessage"], 20)
+        # SendMessage failing is expected from SendMessage, nothing to shout about
+        self.assertEqual(self.emitted, [])
+
+    def test_unexpectedErrorsAreRateLimited(self):
+        channel = ErrorChannel(
+            capacity=8, rateLimitSeconds=60, sink=self.emitted.append
+        )
+        error = pywinError(5, "OpenProcess", "Access is denied.")
+
+        for _ in range(100):
+            channel.report(error, "GetModuleFileNameEx", expected=False)
+
+        self.assertEqual(len(self.emitted), 1)
+        self.assertEqual(len(channel.recent), 8)
+        self.assertEqual(channel.stats()["suppressed"], 99)
+        self.assertEqual(channel.counters["GetModuleFileNameEx"], 100)
+
+
+@unittest.skipIf(not run_T_DispatchTest, "Skipped")
+class T_DispatchTest(unittest.TestCase):
+
+    def test_blockingQueueIsBackpressure(self):
+        got = []
+        dispatcher = ThreadPoolDispatcher(maxQueue=2)
+
+        for i in range(10):
+            dispatcher.submit(lambda i: (time.sleep(0.01), got.append(i)), i)
+        dispatcher.close()
+
+        metrics = dispatcher.metrics()
+        self.assertEqual(got, list(range(10)))
+        self.assertLessEqual(metrics["maxQueueDepth"], 2)
+        self.assertEqual(metrics["dropped"], 0)
+        self.assertGreater(metrics["lagMax"], 0)
+
+    def test_overflowDrops(self):
+        for overflow, kept in [
+            (OVERFLOW_DROP_OLDEST, [8, 9]),
+            (OVERFLOW_DROP_NEWEST, [0, 1]),
+        ]:
+            got = []
+            gate = Event()
+            dispatcher = ThreadPoolDispatcher(maxQueue=2, overflow=overflow)
+
+            # Hold the only worker so everything after piles up in the queue
+            dispatcher.submit(gate.wait)
+            time.sleep(actionWaitTime)
+            for i in range(10):
+                dispatcher.submit(got.append, i)
+
+            gate.set()
+            dispatcher.close()
+
+            self.assertEqual(got, kept, overflow)
+            self.assertEqual(dispatcher.metrics()["dropped"], 8)
+
+    def test_coalescingKeepsLatest(self):
+        got = []
+        gate = Event()
+        dispatcher = ThreadPoolDispatcher(coalesce=True)
+
+        dispatcher.submit(gate.wait)
+        time.sleep(actionWaitTime)
+        for i in range(20):
+            dispatcher.submit(got.append, i, key="foreground")
+
+        gate.set()
+        dispatcher.close()
+
+        self.assertEqual(got, [19])
+        self.assertEqual(dispatcher.metrics()["coalesced"], 19)
+
+    def test_debounceWaitsForQuiet(self):
+        got = []
+        dispatcher = ThreadPoolDispatcher(debounceSeconds=0.2)
+
+        for i in range(5):
+            dispatcher.submit(got.append, i, key="foreground")
+            time.sleep(0.05)
+
+        self.assertEqual(got, [])
+        time.sleep(0.3)
+        self.assertEqual(got, [4])
+        dispatcher.close()
+
+    def test_debouncedKeyDoesntHoldOthers(self):
+        got = []
+        dispatcher = ThreadPoolDispatcher(debounceSeconds=0.2)
+
+        dispatcher.submit(got.append, "foreground", key="foreground")
+        dispatcher.submit(got.append, 0x1234, key=0x1234)
+        dispatcher.submit(got.append, "unkeyed")
+
+        # Foreground keeps flapping the whole time, 0x1234 has been quiet since the start
+        for _ in range(10):
+            time.sleep(0.1)
+            dispatcher.submit(got.append, "foreground", key="foreground")
+
+        self.assertEqual(got, ["unkeyed", 0x1234])
+        dispatcher.close()
+        self.assertEqual(got, ["unkeyed", 0x1234, "foreground"])
+
+    def test_inlineRunsRightAway(self):
+        got = []
+        dispatcher = InlineDispatcher()
+
+        dispatcher.submit(got.append, 1)
+        dispatcher.submit(lambda: 1 / 0)
+
+        self.assertEqual(got, [1])
+        self.assertEqual(dispatcher.metrics()["dispatched"], 2)
+        self.assertEqual(dispatcher.metrics()["failed"], 1)
+        self.assertIsInstance(dispatcher.lastError, ZeroDivisionError)
+
+    def test_asyncio(self):
+        got = []
+
+        async def failing(value):
+            await asyncio.sleep(0)
+            raise ValueError(value)
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            dispatcher = AsyncioDispatcher(loop, coalesce=True, debounceSeconds=0.1)
+
+            def submitAll():
+                # Same as the event loops, from some other thread
+                for i in range(10):
+                    dispatcher.submit(got.append, i, key="foreground")
+
+                dispatcher.submit(got.append, "unkeyed")
+                dispatcher.submit(failing, "broken")
+
+            await asyncio.to_thread(submitAll)
+            await asyncio.sleep(0.05)
+            self.assertEqual(got, ["unkeyed"])
+
+            await asyncio.sleep(0.2)
+            dispatcher.close()
+            return dispatcher
+
+        dispatcher = asyncio.run(main())
+
+        self.assertEqual(got, ["unkeyed", 9])
+        self.assertEqual(dispatcher.metrics()["coalesced"], 9)
+        self.assertEqual(dispatcher.metrics()["failed"], 1)
+        self.assertIsInstance(dispatcher.lastError, ValueError)
+
+    def test_slowCallbackDoesntHoldTheEventLoop(self):
+        desktop = useSimulatedDesktop(self)
+        dispatcher = ThreadPoolDispatcher()
+        done = Event()
+
+        def slowCallback(window):
+            time.sleep(1)
+            done.set()
+
+        try:
+            desktop.createWindow("Dispatched")
+            thread = event_windowCreated(
+                slowCallback, {"keyword": "Dispatched"}, dispatcher=dispatcher
+            )
+
+            thread.join(0.5)
+            self.assertFalse(thread.is_alive())
+            self.assertFalse(done.is_set())
+            self.assertTrue(done.wait(2))
+
+        finally:
+            dispatcher.close()
+
+
+@unittest.skipIf(not run_T_HandlePoolTest, "Skipped")
+class T_HandlePoolTest(SimulatedDesktopTest):
+
+    def test_windowsShareOneHandle(self):
+        for i in range(10):
+            self.desktop.createWindow(
+                f"Pooled {i}", processID=4242, exePath="C:\\pool.exe"
+            )
+
+        before = handlePool.stats()
+        windows = [searchForWindowByTitle(f"Pooled {i}") for i in range(10)]
+
+        self.assertTrue(all(window.exePath == "C:\\pool.exe" for window in windows))
+        # One OpenProcess for the lot, and it stays open for the next one
+        self.assertEqual(len(self.desktop.handles), 1)
+        self.assertEqual(handlePool.stats()["misses"] - before["misses"], 1)
+
+        # Swapping backends hands everything back
+        useBackend(SimulatedBackend())
+        self.assertEqual(self.desktop.handles, {})
+        useBackend(self.desktop)
+
+    def test_accessRightsWiden(self):
+        pool = ProcessHandlePool()
+        self.desktop.createWindow("Access", processID=4242)
+
+        narrow = pool.acquire(4242, 0x400)
+        wide = pool.acquire(4242, 0x410)
+        again = pool.acquire(4242, 0x010)
+
+        self.assertIsNot(narrow, wide)
+        self.assertIs(wide, again)
+        self.assertEqual(wide.access, 0x1410)
+        # The narrow one is still borrowed, it can't be closed yet
+        self.assertEqual(pool.openHandles(), 2)
+
+        pool.release(narrow)
+        self.assertEqual(pool.openHandles(), 1)
+        self.assertEqual(len(self.desktop.handles), 1)
+
+        pool.release(wide)
+        pool.release(again)
+        pool.clear()
+        self.assertEqual(self.desktop.handles, {})
+
+    def test_exitedProcessIsntReused(self):
+        pool = ProcessHandlePool()
+        hwnd = self.desktop.createWindow("Exits", processID=4242, exePath="C:\\old.exe")
+        pool.release(pool.acquire(4242, 0x400))
+
+        self.desktop.destroyWindow(hwnd)
+        # Same pid, different process
+        self.desktop.createWindow("Reused", processID=4242, exePath="C:\\new.exe")
+
+        entry = pool.acquire(4242, 0x400)
+        self.assertEqual(
+            self.desktop.GetModuleFileNameEx(entry.handle, 0), "C:\\new.exe"
+        )
+        self.assertEqual(pool.invalidations, 1)
+        pool.release(entry)
+
+    def test_handlesCanAlwaysCheckTheProcess(self):
+        pool = ProcessHandlePool()
+        self.desktop.createWindow("Read Only", processID=4242)
+
+        # PROCESS_VM_READ alone isn't enough for GetExitCodeProcess
+        with self.assertRaises(self.desktop.error):
+            self.desktop.GetExitCodeProcess(
+                self.desktop.OpenProcess(0x010, False, 4242)
+            )
+
+        first = pool.acquire(4242, 0x010)
+        pool.release(first)
+        second = pool.acquire(4242, 0x010)
+
+        self.assertIs(first, second)
+        self.assertEqual(pool.invalidations, 0)
+        self.assertEqual((pool.hits, pool.misses), (1, 1))
+        pool.release(second)
+
+    def test_accessDeniedIsRemembered(self):
+        pool = ProcessHandlePool()
+        self.desktop.createWindow("Elevated", processID=4242, elevated=True)
+
+        for _ in range(5):
+            with self.assertRaises(self.desktop.error):
+                pool.acquire(4242, 0x400)
+
+        # Only the first one got as far as OpenProcess
+        self.assertEqual((pool.misses, pool.denials), (1, 4))
+        self.assertEqual(self.desktop.handles, {})
+
+        pool.invalidate(4242)
+        with self.assertRaises(self.desktop.error):
+            pool.acquire(4242, 0x400)
+        self.assertEqual(pool.misses, 2)
+
+    def test_idleHandlesCloseWithoutTraffic(self):
+        pool = ProcessHandlePool(idleSeconds=0.05, sweepSeconds=0.05)
+        self.desktop.createWindow("Idle", processID=4242)
+
+        pool.release(pool.acquire(4242, 0x400))
+        time.sleep(0.3)
+
+        self.assertEqual(pool.openHandles(), 0)
+        self.assertEqual(self.desktop.handles, {})
+
+    def test_idleHandlesAreEvicted(self):
+        pool = ProcessHandlePool(idleSeconds=0)
+        self.desktop.createWindow("Idle", processID=4242)
+
+        pool.release(pool.acquire(4242, 0x400))
+        pool.evictIdle()
+
+        self.assertEqual(pool.openHandles(), 0)
+        self.assertEqual(pool.evictions, 1)
+        self.assertEqual(self.desktop.handles, {})
+
+
+@unittest.skipIf(not run_T_ControlTest, "Skipped")
+class T_ControlTest(SimulatedDesktopTest):
+
+    def setUp(self):
+        super().setUp()
+
+        d = self.desktop
+        self.dialog = d.createWindow("Save As")
+        self.group = d.createControl(self.dialog, "Button", "Options", controlID=100)
+        self.check = d.createControl(self.group, "Button", "Read only", controlID=101)
+        self.name = d.createControl(self.dialog, "Edit", "notes.txt", controlID=1001)
+        self.ok = d.createControl(self.dialog, "Button", "OK", controlID=1)
+        self.cancel = d.createControl(self.dialog, "Button", "Cancel", controlID=2)
+
+    def test_childrenAndSearch(self):
+        window = searchForWindowByTitle("Save As")
+
+        children = window.children()
+        self.assertEqual(
+            [c.hwnd for c in children], [self.group, self.name, self.ok, self.cancel]
+        )
+        self.assertEqual([c.hwnd for c in children[0].children], [self.check])
+
+        tree = window.controlTree()
+        self.assertEqual(
+            tree.find(className="Button", title="OK", exact=True).hwnd, self.ok
+        )
+        self.assertEqual(tree.find(controlID=1001).text, "notes.txt")
+        self.assertEqual(len(tree.findAll(className="Button")), 4)
+        # Searching a node only looks under it
+        self.assertEqual(
+            [c.hwnd for c in children[0].findAll(className="Button")], [self.check]
+        )
+        self.assertEqual(tree.find(controlID=101).parent.hwnd, self.group)
+        self.assertIsNone(tree.find(className="ComboBox"))
+
+    def test_treesAreCachedUntilTheyChange(self):
+        window = searchForWindowByTitle("Save As")
+        tree = window.controlTree()
+
+        self.assertIs(window.controlTree(), tree)
+        # Nothing moved, the recheck keeps the same tree
+        self.assertIs(window.controlTree(maxAge=0), tree)
+
+        added = self.desktop.createControl(self.dialog, "Button", "Help", controlID=9)
+        self.assertIs(window.controlTree(), tree)
+
+        rebuilt = window.controlTree(maxAge=0)
+        self.assertIsNot(rebuilt, tree)
+        self.assertEqual(rebuilt.find(title="Help").hwnd, added)
+
+    def test_deadControlMarksStale(self):
+        window = searchForWindowByTitle("Save As")
+        tree = window.controlTree()
+
+        self.desktop.destroyWindow(self.group)
+        self.assertIsNone(tree.find(controlID=101))
+        self.assertTrue(tree.stale)
+
+        rebuilt = window.controlTree()
+        self.assertNotIn(self.check, rebuilt)
+        self.assertEqual(len(rebuilt), 3)
+
+
+@unittest.skipIf(not run_T_DesktopTest, "Skipped")
+class T_DesktopTest(SimulatedDesktopTest):
+
+    def setUp(self):
+        super().setUp()
+
+        self.hwnds = {"Default": self.desktop.createWindow("Operator Notepad")}
+        for name in ["Robot 1", "Robot 2", "Robot 3"]:
+            self.desktop.createDesktop(name, latency=0.3)
+            self.hwnds[name] = self.desktop.createWindow(
+                f"{name} Notepad", desktop=name
+            )
+
+        self.desktop.createDesktop("Winlogon", accessible=False)
+
+    def test_desktopsAreWalkedInParallel(self):
+        snapshot = DesktopSnapshot.take(["Default", "Robot 1", "Robot 2", "Robot 3"])
+
+        self.assertEqual(len(snapshot.searchAll("Notepad")), 4)
+        for name, hwnd in self.hwnds.items():
+            self.assertEqual(snapshot.desktopOf[hwnd], name)
+            self.assertIn(name, snapshot.timings)
+
+        self.assertGreaterEqual(snapshot.timings["Robot 2"], 0.3)
+        # The slowest one, not all three of them added up
+        self.assertLess(snapshot.elapsed, 0.6)
+        self.assertEqual(
+            snapshot.onDesktop("Robot 3").search("Notepad").hwnd, self.hwnds["Robot 3"]
+        )
+
+    def test_everyDesktopByDefault(self):
+        snapshot = DesktopSnapshot.take()
+
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.errors["Winlogon"].winerror, 5)
+        self.assertEqual(snapshot.onDesktop("Winlogon").windows, [])
+        # Plain EnumWindows only ever sees our own desktop
+        self.assertIsNone(searchForWindowByTitle("Robot 1 Notepad"))
+
+
+@unittest.skipIf(not run_T_TimelineTest, "Skipped")
+class T_TimelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeline = ForegroundTimeline()
+        # 100s of editor, 50s of browser, 30s of editor again, then the shell until 200
+        for at, hwnd, exePath in [
+            (1000, 1, "editor.exe"),
+            (1100, 2, "browser.exe"),
+            (1150, 1, "editor.exe"),
+            (1150, 1, "editor.exe"),
+            (1180, 3, "shell.exe"),
+        ]:
+            self.timeline.record(hwnd, hwnd * 10, exePath, at)
+
+        self.segment = self.timeline.segment(end=1200)
+
+    def test_timeInApp(self):
+        self.assertEqual(len(self.timeline), 4)
+        self.assertEqual(
+            self.segment.timeInApp(),
+            {"editor.exe": 130.0, "browser.exe": 50.0, "shell.exe": 20.0},
+        )
+        self.assertEqual(
+            self.segment.timeInApp(1050, 1120),
+            {"editor.exe": 50.0, "browser.exe": 20.0},
+        )
+        self.assertEqual(
+            self.segment.timeBy("processID", 1100, 1160), {10: 10.0, 20: 50.0}
+        )
+        self.assertEqual(self.segment.switches(1100, 1200), 3)
+        self.assertEqual(self.segment.foregroundAt(1120), (2, 20, "browser.exe"))
+        self.assertIsNone(self.segment.foregroundAt(999))
+
+    def test_segmentStartsAtStart(self):
+        # The editor row from 1150 comes along, but only counts from 1160
+        segment = self.timeline.segment(start=1160, end=1200)
+
+        self.assertEqual(segment.since, 1160)
+        self.assertEqual(segment.timeInApp(), {"editor.exe": 20.0, "shell.exe": 20.0})
+        self.assertEqual(segment.switches(), 1)
+        self.assertIsNone(segment.foregroundAt(1155))
+        self.assertEqual(self.segment.switches(), 3)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "segment.fgt")
+            segment.save(path)
+            loaded = TimelineSegment.load(path)
+
+            self.assertEqual(loaded.since, 1160)
+            self.assertEqual(loaded.timeInApp(), segment.timeInApp())
+            del loaded
+
+    def test_ringBufferKeepsNewest(self):
+        timeline = ForegroundTimeline(capacity=8)
+        for i in range(20):
+            timeline.record(i + 1, i, f"{i % 3}.exe", at=float(i))
+
+        self.assertEqual(len(timeline), 8)
+        self.assertEqual(timeline.overwritten, 12)
+        self.assertEqual(
+            [at for at, *_ in timeline.records()], [float(i) for i in range(12, 20)]
+        )
+
+    def test_saveAndLoad(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "segment.fgt")
+            self.segment.save(path)
+            loaded = TimelineSegment.load(path)
+
+            self.assertEqual(loaded.records(), self.segment.records())
+            self.assertEqual(
+                loaded.timeInApp(1050, 1120), self.segment.timeInApp(1050, 1120)
+            )
+            self.assertEqual(loaded.until, 1200)
+            del loaded
+
+    def test_foregroundEventFiresOncePerChange(self):
+        desktop = useSimulatedDesktop(self)
+        first = desktop.createWindow("First", exePath="C:\\first.exe")
+        second = desktop.createWindow(
+            "Second", exePath="C:\\second.exe", foreground=False
+        )
+
+        timeline = ForegroundTimeline()
+        seen = []
+        loop = timeline.watch(timeoutSeconds=5)
+        other = event_foregroundWindowChanged(lambda w: seen.append(w.hwnd), timeout=5)
+
+        desktop.SetForegroundWindow(second)
+        time.sleep(1.2)
+        loop.stop()
+        other.stop()
+
+        self.assertEqual(seen, [second])
+        self.assertEqual(
+            [(hwnd, exePath) for _, hwnd, _, exePath in timeline.records()],
+            [(first, "C:\\first.exe"), (second, "C:\\second.exe")],
+        )
+
+
 os.system("cls")
 unittest.main(verbosity=5)